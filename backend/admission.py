@@ -0,0 +1,238 @@
+# backend/admission.py
+"""Admission control: per-session and per-IP rate limits, and search coalescing
+
+Every request that works on a session takes a token from that session's
+bucket; an empty bucket answers 429 with a Retry-After header before any
+work is done. Searches and the catalog export don't touch sessions and are
+served from caches, so they are left out.
+
+Creating sessions is limited per client IP, so one client can't fill the
+session store and evict everyone else; a limit on every request per IP can
+be turned on as well. Behind a proxy every request comes from the proxy's
+address, so set TRUSTED_PROXIES to the number of proxies in front of the
+app (the Procfile sets 1 for the platform router), or every client shares
+one allowance. Turning both per-IP limits off needs ADMISSION_UNLIMITED=1.
+
+Typeahead searches from one session (those sent with typeahead=1) are
+coalesced: while one runs, later ones wait, and when it finishes only the
+newest waiting query is run and its results are shared by everything that
+waited. Other searches always get their own query's results.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+log = logging.getLogger(__name__)
+
+# Sustained requests per second and burst size for each bucket; a rate of 0
+# turns that limit off
+SESSION_RATE = float(os.environ.get('ADMISSION_SESSION_RATE', 10))
+SESSION_BURST = float(os.environ.get('ADMISSION_SESSION_BURST', 30))
+# Off by default; suggested when enabled: 50/200
+IP_RATE = float(os.environ.get('ADMISSION_IP_RATE', 0))
+IP_BURST = float(os.environ.get('ADMISSION_IP_BURST', 200))
+NEW_SESSION_RATE = float(os.environ.get('ADMISSION_NEW_SESSION_RATE', 1))
+NEW_SESSION_BURST = float(os.environ.get('ADMISSION_NEW_SESSION_BURST', 30))
+# Proxies in front of the app that append to X-Forwarded-For (1 behind a
+# platform router). Leave at 0 unless there are some: the header is
+# trivially forged otherwise
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+if NEW_SESSION_RATE <= 0 and IP_RATE <= 0 and os.environ.get('ADMISSION_UNLIMITED') != '1':
+    raise RuntimeError("No per-IP limit is set: set ADMISSION_NEW_SESSION_RATE or ADMISSION_IP_RATE, "
+                       "or ADMISSION_UNLIMITED=1 to run without one")
+# Endpoints never limited: monitoring and the (already authenticated) admin
+EXEMPT_ENDPOINTS = {'metrics', 'admin_reload_catalog'}
+# Endpoints that only count against the per-IP limit: cached, sessionless reads
+SESSIONLESS_ENDPOINTS = {'search_courses', 'catalog_export'}
+
+# Counted for /metrics
+stats = {'session_rejections': 0, 'ip_rejections': 0, 'new_session_rejections': 0, 'searches_coalesced': 0}
+
+
+class RateLimited(Exception):
+    """Raised to answer 429; limit names the bucket, retry_after is in seconds"""
+
+    def __init__(self, message, limit, retry_after):
+        super().__init__(message)
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """A token bucket per key, refilled at rate per second up to burst
+
+    Only the max_keys most recently used keys are kept. A forgotten key
+    starts again with a full bucket, so the cap can only ever let more
+    through, never less.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """0 if key had a token to spend, else seconds until it will have one"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+
+session_buckets = TokenBuckets(SESSION_RATE, SESSION_BURST)
+ip_buckets = TokenBuckets(IP_RATE, IP_BURST)
+new_session_buckets = TokenBuckets(NEW_SESSION_RATE, NEW_SESSION_BURST)
+
+
+def client_ip():
+    """The client's address, looking past TRUSTED_PROXIES proxies"""
+    if TRUSTED_PROXIES:
+        route = request.access_route
+        return route[max(len(route) - TRUSTED_PROXIES, 0)]
+    return request.remote_addr
+
+
+def admit_new_session():
+    """Spend a session creation token for this client, or raise RateLimited"""
+    wait = new_session_buckets.take(client_ip())
+    if wait:
+        stats['new_session_rejections'] += 1
+        raise RateLimited('Too many new sessions, try again later', 'new_session', wait)
+
+
+class _Group:
+    """Searches waiting behind the running one; they all get the newest query's results"""
+    __slots__ = ('query', 'leader', 'turn', 'done', 'result', 'error')
+
+    def __init__(self):
+        self.query = None
+        self.leader = None    # the newest waiter, which runs the search
+        self.turn = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCoalescer:
+    """At most one search running per key; waiting ones collapse into the newest"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # key -> _Group waiting, or None while one runs alone
+
+    def run(self, key, query, search):
+        """(query searched, search(query searched)) for a search of query under key
+
+        The query searched is query itself unless a newer one from the same
+        key replaced it while it waited.
+        """
+        me = object()
+        with self._lock:
+            if key not in self._pending:
+                self._pending[key] = None
+                group = None
+            else:
+                group = self._pending[key]
+                if group is None:
+                    group = self._pending[key] = _Group()
+                else:
+                    stats['searches_coalesced'] += 1
+                group.query = query
+                group.leader = me
+        if group is None:
+            try:
+                return query, search(query)
+            finally:
+                self._next(key)
+
+        group.turn.wait()
+        if group.leader is not me:
+            group.done.wait()
+            if group.error is not None:
+                raise group.error
+            return group.query, group.result
+        try:
+            group.result = search(group.query)
+        except Exception as e:
+            group.error = e
+            raise
+        finally:
+            group.done.set()
+            self._next(key)
+        return group.query, group.result
+
+    def _next(self, key):
+        """Let the waiting group run, if there is one"""
+        with self._lock:
+            group = self._pending[key]
+            if group is None:
+                del self._pending[key]
+            else:
+                self._pending[key] = None
+        if group is not None:
+            group.turn.set()
+
+
+search_coalescer = SearchCoalescer()
+
+
+def init_app(app):
+    """Rate limit every request by client IP and session before it's handled
+
+    Register before the session locking, so throttled requests never wait
+    for a lock.
+    """
+    warned = []
+
+    @app.before_request
+    def admit_request():
+        if request.method == 'OPTIONS' or request.endpoint in EXEMPT_ENDPOINTS:
+            return
+        if not TRUSTED_PROXIES and not warned and 'X-Forwarded-For' in request.headers:
+            warned.append(True)
+            log.warning('request came through a proxy but TRUSTED_PROXIES is 0; '
+                        'per-IP limits see the proxy as the only client')
+        wait = ip_buckets.take(client_ip())
+        if wait:
+            stats['ip_rejections'] += 1
+            raise RateLimited('Too many requests from this address, slow down', 'ip', wait)
+        session_id = request.args.get('session')
+        if session_id and request.endpoint not in SESSIONLESS_ENDPOINTS:
+            wait = session_buckets.take(session_id)
+            if wait:
+                stats['session_rejections'] += 1
+                raise RateLimited('Too many requests for this session, slow down', 'session', wait)
+
+    @app.errorhandler(RateLimited)
+    def rate_limited(e):
+        log.warning('request throttled', extra={'limit': e.limit, 'client_ip': client_ip()})
+        # Never a session id minted for this request: it was refused
+        response = jsonify({
+            'success': False,
+            'message': str(e),
+            'retry_after': round(e.retry_after, 3),
+            'session_id': request.args.get('session')
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response
@@ -0,0 +1,635 @@
+# backend/benchmark.py
+"""Micro-benchmarks and load generator for the backend
+
+    python benchmark.py micro -o micro.json
+    python benchmark.py load --sessions 200 -o load.json
+    python benchmark.py load --gunicorn --workers 4 --concurrency 16
+    python benchmark.py stress --threads 16 --operations 500
+    python benchmark.py startup --repeat 10
+    python benchmark.py suggest --subjects 11
+    python benchmark.py compare before.json after.json
+
+Every command prints (and with -o writes) one JSON document, so runs from
+different commits can be diffed with `compare`.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# All load comes from one address and a handful of sessions, which the
+# admission limits exist to stop; measure the app itself (also inherited by
+# the gunicorn server)
+for _name in ('ADMISSION_IP_RATE', 'ADMISSION_SESSION_RATE', 'ADMISSION_NEW_SESSION_RATE'):
+    os.environ.setdefault(_name, '0')
+os.environ.setdefault('ADMISSION_UNLIMITED', '1')
+
+# A realistic typeahead mix: prefixes of codes and title words as people type them
+SEARCH_QUERIES = [
+    'ma', 'mat', 'math', 'math ', 'math 3', 'math 30', 'bi', 'bio', 'biol', 'biol 4',
+    'ch', 'che', 'chem', 'chem 3', 'ph', 'phys', 'cpsc', 'cpsc 3', 'stat', 'psyc',
+    'eosc', 'isci', 'isci 4', 'intro', 'genetics', 'cell', 'ecology', 'quantum',
+    'data', 'the', 'of ', 'evolution', 'organic', 'neuro', 'xx', 'zzz',
+]
+
+
+def percentiles(samples):
+    """Summary statistics for a list of durations in seconds, reported in ms"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4),
+        'p50_ms': round(pick(0.50), 4),
+        'p95_ms': round(pick(0.95), 4),
+        'p99_ms': round(pick(0.99), 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+    }
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+# --- Micro-benchmarks ---
+
+def build_proposal(size, seed=0):
+    """A proposal with roughly size courses spread over ISCI and three disciplines"""
+    from parser import DegreeProposal
+    proposal = DegreeProposal()
+    catalog = proposal.catalog
+    rng = random.Random(seed)
+    by_subject = {}
+    for record in catalog.index.values():
+        by_subject.setdefault(record.code.split()[0], []).append(record)
+    for subject in ('MATH', 'BIOL', 'CHEM'):
+        proposal.add_discipline(subject)
+    isci_codes = [r.code for r in by_subject['ISCI']]
+    for code in rng.sample(isci_codes, min(4, size // 8)):
+        proposal.add_course('ISCI', code)
+    subjects = ['MATH', 'BIOL', 'CHEM']
+    while sum(len(c) for c in proposal.disciplines.values()) < size:
+        subject = subjects[rng.randrange(3)]
+        if not proposal.add_course(subject, rng.choice(by_subject[subject]).code):
+            if all(len(proposal.disciplines[s]) >= len(by_subject[s]) for s in subjects):
+                break
+    return proposal
+
+
+def run_micro(args):
+    from catalog import CourseCatalog, SearchResultCache, get_catalog
+    catalog = get_catalog()
+    results = {}
+
+    results['catalog_load'] = time_calls(lambda: CourseCatalog(), max(3, args.repeat // 100))
+
+    codes = list(catalog.index)
+    proposal = build_proposal(40)
+    results['get_course_credits'] = time_calls(
+        lambda: proposal.get_course_credits(random.choice(codes)), args.repeat)
+
+    for size in (0, 10, 20, 40):
+        sized = build_proposal(size)
+        results[f'validate_proposal[{size}]'] = time_calls(sized.validate_proposal, args.repeat)
+
+    queries = iter(SEARCH_QUERIES * (args.repeat // len(SEARCH_QUERIES) + 1))
+    results['search_courses'] = time_calls(lambda: proposal.search_courses(next(queries)), args.repeat)
+
+    cache = SearchResultCache()
+    queries = iter(SEARCH_QUERIES * (args.repeat // len(SEARCH_QUERIES) + 1))
+    results['search_courses_cached'] = time_calls(
+        lambda: cache.get_or_search(catalog, next(queries)), args.repeat)
+    return {'kind': 'micro', 'environment': environment(), 'results': results}
+
+
+# --- Load generation ---
+
+class TestClientTransport:
+    """Drives the Flask app in-process through its test client"""
+
+    def __init__(self):
+        from parser import app
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json()
+
+
+class HttpTransport:
+    """Drives a running server over HTTP, one connection per thread"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self._local.conn = None
+            raise
+        return response.status, json.loads(data) if data else None
+
+
+def session_lifecycle(transport, rng, record, catalog):
+    """One planner: start, pick disciplines, search and add courses, adjust, validate"""
+    def call(name, method, path, body=None):
+        start = time.perf_counter()
+        status, data = transport.request(method, path, body)
+        record(name, time.perf_counter() - start, status)
+        return data
+
+    session_id = call('reset', 'POST', '/reset')['session_id']
+    query = f'?session={session_id}'
+    subjects = rng.sample(['MATH', 'BIOL', 'CHEM', 'PHYS', 'CPSC', 'EOSC', 'STAT'], 3)
+    for subject in subjects:
+        call('add_discipline', 'POST', '/disciplines' + query, {'discipline_name': subject})
+
+    by_subject = catalog['by_subject']
+    added = []
+    for _ in range(rng.randint(8, 20)):
+        subject = rng.choice(subjects)
+        code = rng.choice(by_subject[subject])
+        # Typeahead: one search per keystroke after the second character
+        for n in range(2, len(code) + 1):
+            call('search_courses', 'GET', f'/search-courses{query}&query={code[:n].replace(" ", "%20")}')
+        data = call('add_course', 'POST', '/courses' + query, {'discipline_name': subject, 'course_code': code})
+        if data and data.get('success'):
+            added.append((subject, code))
+    for code in rng.sample(by_subject['ISCI'], 2):
+        call('add_course', 'POST', '/courses' + query, {'discipline_name': 'ISCI', 'course_code': code})
+
+    for subject, code in rng.sample(added, min(3, len(added))):
+        call('remove_course', 'DELETE', '/courses' + query, {'discipline_name': subject, 'course_code': code})
+    call('set_stream', 'POST', '/set-stream' + query, {'stream': rng.choice(['regular', 'honours'])})
+    call('validate', 'GET', '/validate' + query)
+    call('proposal_state', 'GET', '/proposal-state' + query)
+
+
+def catalog_summary():
+    from catalog import get_catalog
+    by_subject = {}
+    for record in get_catalog().index.values():
+        by_subject.setdefault(record.code.split()[0], []).append(record.code)
+    return {'by_subject': by_subject}
+
+
+def drive(transport, sessions, concurrency, seed):
+    """Run session lifecycles on concurrency threads, return per-endpoint stats"""
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    catalog = catalog_summary()
+
+    def record(name, duration, status):
+        with lock:
+            samples.setdefault(name, []).append(duration)
+            if status >= 500:
+                errors[name] = errors.get(name, 0) + 1
+
+    counter = iter(range(sessions))
+
+    def worker():
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            session_lifecycle(transport, random.Random(seed + n), record, catalog)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total_requests = sum(len(s) for s in samples.values())
+    return {
+        'sessions': sessions,
+        'concurrency': concurrency,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / elapsed, 1),
+        'errors': errors,
+        'overall': percentiles([d for s in samples.values() for d in s]),
+        'endpoints': {name: percentiles(s) for name, s in sorted(samples.items())},
+    }
+
+
+def per_session_memory(count=500):
+    """Bytes retained per session held in the in-memory store"""
+    import parser
+    # get_user_proposal reads flask.g, so it needs a request context
+    with parser.app.test_request_context():
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        ids = [parser.get_user_proposal()[0] for _ in range(count)]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    for session_id in ids:
+        parser.session_store.delete(session_id)
+    return round(retained / count, 1)
+
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def run_load(args):
+    result = {'kind': 'load', 'environment': environment()}
+    if not args.gunicorn:
+        # Warm the catalog so the first request isn't billed for loading it
+        from catalog import get_catalog
+        get_catalog()
+        result['transport'] = 'test_client'
+        result['per_session_bytes'] = per_session_memory()
+        result.update(drive(TestClientTransport(), args.sessions, args.concurrency, args.seed))
+        return result
+
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{port}']
+    if args.threads:
+        command += ['--threads', str(args.threads)]
+    command.append('parser:app')
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        transport = HttpTransport('127.0.0.1', port)
+        deadline = time.time() + 30
+        while True:
+            try:
+                transport.request('GET', '/search-courses?query=ma')
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+        workers = child_pids(server.pid)
+        result['transport'] = 'gunicorn'
+        result['workers'] = args.workers
+        result['threads'] = args.threads
+        result['worker_rss_kb_before'] = [rss_kb(pid) for pid in workers]
+        result.update(drive(transport, args.sessions, args.concurrency, args.seed))
+        result['worker_rss_kb_after'] = [rss_kb(pid) for pid in workers]
+        grown = [a - b for a, b in zip(result['worker_rss_kb_after'], result['worker_rss_kb_before'])
+                 if a is not None and b is not None]
+        if grown:
+            result['rss_kb_per_session'] = round(sum(grown) / args.sessions, 2)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return result
+
+
+# --- Concurrency stress test ---
+
+def check_proposal(proposal):
+    """Problems with a proposal's internal consistency, as a list of strings"""
+    problems = []
+    seen = {}
+    for discipline in proposal.discipline_order:
+        for code in proposal.disciplines[discipline]:
+            if code in seen:
+                problems.append(f'{code} is in both {seen[code]} and {discipline}')
+            seen[code] = discipline
+    if seen != proposal.course_owner:
+        problems.append('course_owner does not match the course lists')
+    if set(proposal.disciplines) != set(proposal.discipline_order):
+        problems.append('discipline_order does not match disciplines')
+    # Incremental totals must equal a from-scratch rebuild
+    if json.dumps(proposal.validate_proposal()) != json.dumps(proposal.copy().validate_proposal()):
+        problems.append('incremental totals differ from a full recompute')
+    return problems
+
+
+def run_stress(args):
+    """Hammer one shared session and one private session per thread concurrently
+
+    Every successful add/remove of a course on the shared session is
+    recorded; afterwards each course must be present exactly when its
+    successful adds outnumber its removes, and every proposal must be
+    internally consistent.
+    """
+    import parser
+    catalog = catalog_summary()
+    subjects = ['MATH', 'BIOL', 'CHEM']
+    codes = {subject: catalog['by_subject'][subject][:15] for subject in subjects}
+
+    client = parser.app.test_client()
+    shared = client.post('/reset').get_json()['session_id']
+    for subject in subjects:
+        client.post(f'/disciplines?session={shared}', json={'discipline_name': subject})
+
+    lock = threading.Lock()
+    net_adds = {}
+    statuses = {}
+    private_sessions = []
+
+    def worker(n):
+        rng = random.Random(args.seed + n)
+        client = parser.app.test_client()
+        private = client.post('/reset').get_json()['session_id']
+        with lock:
+            private_sessions.append(private)
+        for subject in subjects:
+            client.post(f'/disciplines?session={private}', json={'discipline_name': subject})
+        for _ in range(args.operations):
+            session_id = shared if rng.random() < 0.5 else private
+            subject = rng.choice(subjects)
+            code = rng.choice(codes[subject])
+            body = {'discipline_name': subject, 'course_code': code}
+            roll = rng.random()
+            if roll < 0.5:
+                response = client.post(f'/courses?session={session_id}', json=body)
+                delta = 1
+            elif roll < 0.9:
+                response = client.delete(f'/courses?session={session_id}', json=body)
+                delta = -1
+            else:
+                stream = rng.choice(['regular', 'honours'])
+                response = client.post(f'/set-stream?session={session_id}', json={'stream': stream})
+                delta = 0
+            data = response.get_json()
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if session_id == shared and delta and data.get('success'):
+                    net_adds[code] = net_adds.get(code, 0) + delta
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    problems = []
+    with parser.app.test_request_context():
+        _, proposal = parser.get_user_proposal(shared)
+        present = set(proposal.course_owner)
+        for code, net in sorted(net_adds.items()):
+            if net not in (0, 1) or (net == 1) != (code in present):
+                problems.append(f'shared session: {code} has net adds {net} but present={code in present}')
+        for session_id in [shared] + private_sessions:
+            _, proposal = parser.get_user_proposal(session_id)
+            problems += [f'{session_id}: {problem}' for problem in check_proposal(proposal)]
+
+    operations = args.threads * args.operations
+    return {
+        'kind': 'stress',
+        'environment': environment(),
+        'threads': args.threads,
+        'operations': operations,
+        'elapsed_seconds': round(elapsed, 3),
+        'operations_per_second': round(operations / elapsed, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'ok': not problems and set(statuses) == {200},
+        'problems': problems[:50],
+    }
+
+
+# --- Degree completion suggestions ---
+
+def run_suggest(args):
+    """Time suggest_completion on empty proposals over the largest subjects
+
+    Empty proposals leave every requirement unmet, and the largest subjects
+    have the most course classes, so these are the hardest searches.
+    """
+    from itertools import combinations
+    from catalog import get_catalog
+    from parser import DegreeProposal
+    from rules import get_plan
+    from suggest import suggest_completion
+    catalog = get_catalog()
+    sizes = {}
+    for code in catalog.index:
+        subject = code.split()[0]
+        if subject != "ISCI":
+            sizes[subject] = sizes.get(subject, 0) + 1
+    subjects = sorted(sizes, key=lambda s: (-sizes[s], s))[:args.subjects]
+
+    samples = []
+    slowest = []
+    not_optimal = incomplete = wrong = 0
+    for stream in ('regular', 'honours'):
+        for count in (2, 3):
+            for disciplines in combinations(subjects, count):
+                proposal = DegreeProposal(catalog)
+                proposal.set_stream(stream)
+                for discipline in disciplines:
+                    proposal.add_discipline(discipline)
+                validation = proposal.validate_proposal()
+                start = time.perf_counter()
+                result = suggest_completion(proposal, get_plan(stream), validation)
+                elapsed = time.perf_counter() - start
+                samples.append(elapsed)
+                slowest.append((elapsed, stream, disciplines, len(result['courses'])))
+
+                not_optimal += not result['optimal']
+                incomplete += not result['complete']
+                for course in result['courses']:
+                    proposal.add_course(course['discipline'], course['code'])
+                if result['complete'] and not proposal.validate_proposal()['success']:
+                    wrong += 1
+
+    slowest.sort(reverse=True)
+    return {
+        'kind': 'suggest',
+        'environment': environment(),
+        'results': {'suggest_completion': percentiles(samples)},
+        'proposals': len(samples),
+        'not_proven_optimal': not_optimal,
+        'incomplete': incomplete,
+        'wrong': wrong,
+        'slowest': [{'stream': stream, 'disciplines': list(disciplines), 'courses': courses,
+                     'ms': round(elapsed * 1000, 2)}
+                    for elapsed, stream, disciplines, courses in slowest[:5]],
+        'ok': wrong == 0,
+    }
+
+
+# --- Cold start ---
+
+# Run in a fresh interpreter: what a gunicorn worker does before its first request
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import parser
+imported = time.perf_counter()
+from catalog import get_catalog
+catalog = get_catalog()
+parser.DegreeProposal().validate_proposal()
+ready = time.perf_counter()
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+print(json.dumps({
+    'import_s': imported - start,
+    'ready_s': ready - start,
+    'rss_kb': rss,
+    'catalog_source': catalog.source,
+    'pandas_loaded': 'pandas' in sys.modules,
+    'numpy_loaded': 'numpy' in sys.modules,
+}))
+'''
+
+
+def run_startup(args):
+    runs = []
+    for _ in range(args.repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    rss = sorted(run['rss_kb'] for run in runs)
+    return {
+        'kind': 'startup',
+        'environment': environment(),
+        'results': {
+            'import_app': percentiles([run['import_s'] for run in runs]),
+            'ready': percentiles([run['ready_s'] for run in runs]),
+            'rss_kb': {'min': rss[0], 'median': rss[len(rss) // 2], 'max': rss[-1]},
+        },
+        'catalog_source': runs[-1]['catalog_source'],
+        'pandas_loaded': runs[-1]['pandas_loaded'],
+        'numpy_loaded': runs[-1]['numpy_loaded'],
+    }
+
+
+# --- Comparing runs ---
+
+def flatten(document, prefix=''):
+    values = {}
+    for key, value in document.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            values.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def run_compare(args):
+    with open(args.before) as f:
+        before = flatten(json.load(f))
+    with open(args.after) as f:
+        after = flatten(json.load(f))
+    changes = {}
+    for name in sorted(before.keys() & after.keys()):
+        if before[name]:
+            changes[name] = {
+                'before': before[name],
+                'after': after[name],
+                'ratio': round(after[name] / before[name], 3),
+            }
+    return {'kind': 'compare', 'changes': changes}
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    micro = commands.add_parser('micro', help='time catalog load, credits, validation and search')
+    micro.add_argument('--repeat', type=int, default=2000)
+
+    load = commands.add_parser('load', help='simulate planners against the app')
+    load.add_argument('--sessions', type=int, default=100)
+    load.add_argument('--concurrency', type=int, default=1)
+    load.add_argument('--seed', type=int, default=0)
+    load.add_argument('--gunicorn', action='store_true', help='drive a local gunicorn over HTTP')
+    load.add_argument('--workers', type=int, default=2)
+    load.add_argument('--threads', type=int, default=0)
+
+    stress = commands.add_parser('stress', help='concurrent mutations on shared and private sessions')
+    stress.add_argument('--threads', type=int, default=16)
+    stress.add_argument('--operations', type=int, default=500, help='operations per thread')
+    stress.add_argument('--seed', type=int, default=0)
+
+    suggest = commands.add_parser('suggest', help='degree completion suggestions on worst-case proposals')
+    suggest.add_argument('--subjects', type=int, default=11, help='largest subjects to combine')
+
+    startup = commands.add_parser('startup', help='import time and RSS of a fresh worker process')
+    startup.add_argument('--repeat', type=int, default=10)
+
+    compare = commands.add_parser('compare', help='ratios between two result files')
+    compare.add_argument('before')
+    compare.add_argument('after')
+
+    for command in (micro, load, stress, suggest, startup, compare):
+        command.add_argument('-o', '--output', help='also write the JSON result here')
+
+    args = arg_parser.parse_args(argv)
+    runners = {'micro': run_micro, 'load': run_load, 'stress': run_stress, 'suggest': run_suggest,
+               'startup': run_startup, 'compare': run_compare}
+    result = runners[args.command](args)
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if result.get('ok') is False:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
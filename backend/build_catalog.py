@@ -0,0 +1,35 @@
+# backend/build_catalog.py
+"""Compile courses.csv into the binary snapshot the app memory-maps at startup
+
+    python build_catalog.py
+    python build_catalog.py --csv courses.csv -o courses.snapshot
+
+Run it before starting the workers, so they all map the same file. A
+missing or stale snapshot isn't an error: the first process to load the
+catalog compiles it.
+"""
+import argparse
+import time
+
+from catalog import CATALOG_PATH, catalog_version, read_csv_records, snapshot_path_for, write_snapshot
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    arg_parser.add_argument('--csv', default=CATALOG_PATH, help='catalog CSV to compile')
+    arg_parser.add_argument('-o', '--output', help='snapshot file to write (default: next to the CSV)')
+    args = arg_parser.parse_args(argv)
+    output = args.output or snapshot_path_for(args.csv)
+
+    start = time.perf_counter()
+    with open(args.csv, 'rb') as f:
+        data = f.read()
+    records = read_csv_records(data)
+    version = catalog_version(data)
+    write_snapshot(records, version, output)
+    print(f"Wrote {len(records)} courses (version {version}) to {output} "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# backend/bulk_validate.py
+"""Validate many saved proposals at once, e.g. for advisor audits
+
+    python bulk_validate.py proposals.jsonl -o results.jsonl
+    python bulk_validate.py --sqlite sessions.db
+    python bulk_validate.py --benchmark 10000
+
+Input lines are either the compact session-store form ({"s": ..., "d": ...})
+or the /proposal-state form ({"stream": ..., "disciplines": ...,
+"discipline_order": ...}). Every proposal is flattened into one list of
+(discipline slot, catalog row) entries, and all credit totals and the
+ordered honorary cap are computed with NumPy over that list in one pass.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from catalog import get_catalog
+from catalog_arrays import get_catalog_arrays
+from parser import DegreeProposal, build_validation_results
+from rules import get_plan
+
+
+def parse_state(state):
+    """Return (stream, [(discipline, [course codes])...]) for either state form"""
+    if 'd' in state:
+        return state['s'], [(d, courses) for d, courses in state['d']]
+    disciplines = state['disciplines']
+    order = state.get('discipline_order') or list(disciplines)
+    return state.get('stream', 'regular'), [(d, disciplines[d]) for d in order if d in disciplines]
+
+
+def _typed(total, count):
+    # The per-proposal code reports an untouched total as the integer 0
+    return float(total) if count else 0
+
+
+def validate_many(states, catalog=None):
+    """Validate proposal states in bulk
+
+    Returns one dict per state, identical to DegreeProposal.validate_proposal().
+    """
+    catalog = catalog if catalog is not None else get_catalog()
+    arrays = get_catalog_arrays(catalog)
+    parsed = [parse_state(state) for state in states]
+    n_proposals = len(parsed)
+    if not n_proposals:
+        return []
+
+    # --- Encode: one slot per (proposal, discipline), one entry per course ---
+    slot_proposal = []
+    slot_is_isci = []
+    entry_slot = []
+    entry_row = []
+    row_of = arrays.row
+    for p, (_, disciplines) in enumerate(parsed):
+        for discipline, courses in disciplines:
+            slot = len(slot_proposal)
+            slot_proposal.append(p)
+            slot_is_isci.append(discipline == "ISCI")
+            for code in courses:
+                row = row_of.get(code)
+                if row is not None:
+                    entry_slot.append(slot)
+                    entry_row.append(row)
+
+    n_slots = len(slot_proposal)
+    slot_proposal = np.array(slot_proposal, dtype=np.intp)
+    slot_is_isci = np.array(slot_is_isci, dtype=bool)
+    entry_slot = np.array(entry_slot, dtype=np.intp)
+    entry_row = np.array(entry_row, dtype=np.intp)
+    entry_proposal = slot_proposal[entry_slot]
+    entry_is_isci = slot_is_isci[entry_slot]
+
+    def per_slot(weights=None):
+        return np.bincount(entry_slot, weights=weights, minlength=n_slots)
+
+    def per_proposal(mask, weights):
+        return (np.bincount(entry_proposal[mask], weights=weights[mask], minlength=n_proposals),
+                np.bincount(entry_proposal[mask], minlength=n_proposals))
+
+    # --- Per-discipline totals (NaN credits propagate, as in the loop) ---
+    credit = arrays.credit[entry_row]
+    is_400 = arrays.is_400_level[entry_row]
+    slot_count = per_slot()
+    slot_credits = per_slot(credit)
+    slot_400_count = per_slot(is_400.astype(float))
+    slot_400_credits = per_slot(np.where(is_400, credit, 0.0))
+
+    # --- Per-proposal totals ---
+    non_isci_slots = ~slot_is_isci
+    total_credits = np.bincount(slot_proposal[non_isci_slots], weights=slot_credits[non_isci_slots],
+                                minlength=n_proposals)
+    total_credits_count = np.bincount(slot_proposal[non_isci_slots], weights=(slot_count[non_isci_slots] > 0).astype(float),
+                                      minlength=n_proposals)
+
+    non_isci = ~entry_is_isci
+    total_400, total_400_count = per_proposal(non_isci & is_400, credit)
+
+    isci_mask = entry_is_isci & arrays.isci_course[entry_row]
+    isci_credits, isci_count = per_proposal(isci_mask, arrays.isci_credit[entry_row])
+
+    honorary = arrays.honorary_credit[entry_row]
+    science_mask = non_isci & ~honorary & arrays.science_credit[entry_row]
+    science_credits, science_count = per_proposal(science_mask, arrays.science_value[entry_row])
+
+    has_isci_449 = np.zeros(n_proposals, dtype=bool)
+    has_isci_449[entry_proposal[entry_is_isci & (entry_row == arrays.isci_449_row)]] = True
+
+    # --- Honorary cap: each course counts, in order, only if it still fits ---
+    honorary_mask = non_isci & honorary
+    honorary_proposal = entry_proposal[honorary_mask]
+    honorary_value = arrays.honorary_value[entry_row[honorary_mask]]
+    honorary_per_proposal = np.bincount(honorary_proposal, minlength=n_proposals)
+    honorary_available = np.bincount(honorary_proposal, weights=honorary_value, minlength=n_proposals)
+    cap = np.array([get_plan(stream).max_honorary_credits for stream, _ in parsed], dtype=float)
+
+    honorary_used = np.zeros(n_proposals)
+    honorary_used_count = np.zeros(n_proposals, dtype=np.intp)
+    if len(honorary_proposal):
+        # Entries are grouped by proposal in order: rank each within its proposal
+        starts = np.concatenate(([0], np.cumsum(honorary_per_proposal)[:-1]))
+        rank = np.arange(len(honorary_proposal)) - starts[honorary_proposal]
+        grid = np.zeros((n_proposals, honorary_per_proposal.max()))
+        grid[honorary_proposal, rank] = honorary_value
+        present = np.zeros(grid.shape, dtype=bool)
+        present[honorary_proposal, rank] = True
+        for k in range(grid.shape[1]):
+            fits = present[:, k] & (honorary_used + grid[:, k] <= cap)
+            honorary_used = np.where(fits, honorary_used + grid[:, k], honorary_used)
+            honorary_used_count += fits
+
+    # --- Requirement checks and messages, shared with validate_proposal ---
+    results = []
+    slot = 0
+    for p, (stream, disciplines) in enumerate(parsed):
+        discipline_credits = []
+        for discipline, _ in disciplines:
+            discipline_credits.append((
+                discipline,
+                _typed(slot_credits[slot], slot_count[slot]),
+                _typed(slot_400_credits[slot], slot_400_count[slot]),
+            ))
+            slot += 1
+        results.append(build_validation_results(
+            stream, discipline_credits, bool(has_isci_449[p]),
+            _typed(total_credits[p], total_credits_count[p]),
+            _typed(isci_credits[p], isci_count[p]),
+            _typed(science_credits[p], science_count[p]),
+            _typed(honorary_used[p], honorary_used_count[p]),
+            _typed(honorary_available[p], honorary_per_proposal[p]),
+            _typed(total_400[p], total_400_count[p]),
+        ))
+    return results
+
+
+def summarize(results):
+    """Count how many proposals pass overall and fail each requirement"""
+    failing = {}
+    for result in results:
+        for name, requirement in result['requirements'].items():
+            if name != 'disciplines_requirements' and not requirement['met']:
+                failing[name] = failing.get(name, 0) + 1
+    return {
+        'proposals': len(results),
+        'passing': sum(1 for result in results if result['success']),
+        'failing_by_requirement': failing,
+    }
+
+
+def random_states(count, seed=0, catalog=None):
+    """Synthetic proposals that respect add_course's rules, for benchmarking"""
+    import random
+    catalog = catalog if catalog is not None else get_catalog()
+    rng = random.Random(seed)
+    by_subject = {}
+    isci_codes = []
+    for record in catalog.index.values():
+        by_subject.setdefault(record.code.split()[0], []).append(record.code)
+        if record.isci_course:
+            isci_codes.append(record.code)
+    subjects = sorted(s for s in by_subject if s != "ISCI")
+    states = []
+    for _ in range(count):
+        stream = rng.choice(["regular", "honours"])
+        chosen = rng.sample(subjects, rng.randint(1, 4))
+        disciplines = [["ISCI", rng.sample(isci_codes, rng.randint(0, 4))]]
+        for subject in chosen:
+            pool = by_subject[subject]
+            disciplines.append([subject, rng.sample(pool, min(len(pool), rng.randint(0, 8)))])
+        states.append({'s': stream, 'd': disciplines})
+    return states
+
+
+def benchmark(count):
+    states = random_states(count)
+    start = time.perf_counter()
+    bulk = validate_many(states)
+    bulk_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [DegreeProposal.from_json(json.dumps(state)).validate_proposal() for state in states]
+    single_seconds = time.perf_counter() - start
+
+    identical = json.dumps(bulk) == json.dumps(single)
+    return {
+        'proposals': count,
+        'bulk_seconds': round(bulk_seconds, 4),
+        'one_by_one_seconds': round(single_seconds, 4),
+        'speedup': round(single_seconds / bulk_seconds, 2) if bulk_seconds else None,
+        'identical': identical,
+    }
+
+
+def read_states(args):
+    if args.sqlite:
+        conn = sqlite3.connect(args.sqlite)
+        rows = conn.execute('SELECT session_id, data FROM sessions ORDER BY session_id').fetchall()
+        return [session_id for session_id, _ in rows], [json.loads(data) for _, data in rows]
+    source = open(args.input) if args.input and args.input != '-' else sys.stdin
+    states = [json.loads(line) for line in source if line.strip()]
+    return [state.get('session_id') for state in states], states
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    arg_parser.add_argument('input', nargs='?', help='JSON-lines file of proposal states (- for stdin)')
+    arg_parser.add_argument('--sqlite', help='audit every session in a SQLite session store')
+    arg_parser.add_argument('-o', '--output', help='write one validation result per line here')
+    arg_parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='validate N synthetic proposals in bulk and one by one, and compare')
+    args = arg_parser.parse_args(argv)
+
+    if args.benchmark:
+        print(json.dumps(benchmark(args.benchmark), indent=2))
+        return
+
+    session_ids, states = read_states(args)
+    results = validate_many(states)
+    if args.output:
+        with open(args.output, 'w') as out:
+            for session_id, result in zip(session_ids, results):
+                out.write(json.dumps({'session_id': session_id, **result}) + '\n')
+    print(json.dumps(summarize(results), indent=2))
+
+
+if __name__ == '__main__':
+    main()
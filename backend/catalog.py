@@ -0,0 +1,559 @@
+# backend/catalog.py
+import bisect
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+
+log = logging.getLogger(__name__)
+
+# courses.csv lives next to this file, regardless of the working directory
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'courses.csv')
+
+# Everything validation needs to know about one course, with NaNs resolved
+CourseRecord = namedtuple('CourseRecord', [
+    'code',
+    'title',
+    'discipline_credit',  # float, NaN when the catalog has no value
+    'science_value',
+    'isci_value',
+    'honorary_value',
+    'science_credit',     # True when science_value > 0
+    'isci_course',        # True when isci_value > 0
+    'honorary_credit',    # True when honorary_value > 0
+    'is_400_level',
+])
+
+
+# The whole catalog, serialized for clients once per catalog version
+CatalogExport = namedtuple('CatalogExport', ['etag', 'body', 'gzipped'])
+
+# Bits of the flags column in the catalog export
+EXPORT_FLAGS = (('science_credit', 1), ('isci_course', 2), ('honorary_credit', 4), ('is_400_level', 8))
+
+
+# Cell values read as missing, matching what pandas.read_csv treated as NaN
+MISSING_VALUES = {'', 'nan', 'NaN', 'NA', 'N/A', 'n/a', 'null', 'NULL', 'None'}
+
+
+def _number(text):
+    return float('nan') if text.strip() in MISSING_VALUES else float(text)
+
+
+def _text(text):
+    return '' if text in MISSING_VALUES else text
+
+
+def _resolve(value):
+    return value if value == value else 0
+
+
+def _unresolve(value):
+    # Missing values resolve to the integer 0; store them as NaN again
+    return float('nan') if value == 0 and type(value) is int else value
+
+
+def _is_400_level(course_num):
+    base_num = ''.join(filter(str.isdigit, str(course_num).split()[0]))
+    return int(base_num) >= 400
+
+
+def make_record(code, title, discipline_credit, science_value, isci_value, honorary_value, is_400_level):
+    return CourseRecord(
+        code=code,
+        title=title,
+        discipline_credit=discipline_credit,
+        science_value=science_value,
+        isci_value=isci_value,
+        honorary_value=honorary_value,
+        science_credit=science_value > 0,
+        isci_course=isci_value > 0,
+        honorary_credit=honorary_value > 0,
+        is_400_level=is_400_level,
+    )
+
+
+def read_csv_records(data):
+    """Parse courses.csv bytes into CourseRecords, in file order"""
+    reader = csv.reader(io.StringIO(data.decode('utf-8-sig')))
+    # Strip whitespace from column names
+    columns = {name.strip(): i for i, name in enumerate(next(reader))}
+    records = []
+    for row in reader:
+        if not row:
+            continue
+        cell = lambda name: row[columns[name]]
+        records.append(make_record(
+            code=_text(cell('Course_code')),
+            title=_text(cell('Title')),
+            discipline_credit=_number(cell('discipline_credit')),
+            science_value=_resolve(_number(cell('science_credits'))),
+            isci_value=_resolve(_number(cell('isci_courses'))),
+            honorary_value=_resolve(_number(cell('honorary_credits'))),
+            is_400_level=_is_400_level(_text(cell('Course'))),
+        ))
+    return records
+
+
+# --- Binary snapshot ---
+#
+# Header: magic, catalog version (the CSV hash it was built from), row count
+# and string-table size. Then four little-endian float64 columns
+# (discipline, science, ISCI and honorary credits; NaN where the CSV has no
+# value), one flag byte per row (bit 0: 400-level), the string table
+# offsets (uint32, code and title per row) and the UTF-8 string table
+# itself. Columns are 8-byte aligned so they can be used straight from the
+# memory map.
+
+SNAPSHOT_MAGIC = b'ISCICAT1'
+SNAPSHOT_HEADER = struct.Struct('<8s16sII')
+FLAG_400_LEVEL = 1
+
+
+def snapshot_path_for(path):
+    """Where the snapshot compiled from a catalog CSV lives: next to it"""
+    return os.path.splitext(path)[0] + '.snapshot'
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def write_snapshot(records, version, path):
+    """Compile records into a snapshot file, atomically replacing any old one"""
+    n = len(records)
+    strings = []
+    offsets = array('I', [0])
+    size = 0
+    for record in records:
+        for text in (record.code, record.title):
+            encoded = text.encode('utf-8')
+            strings.append(encoded)
+            size += len(encoded)
+            offsets.append(size)
+
+    columns = [array('d', [r.discipline_credit for r in records])]
+    columns += [array('d', [_unresolve(getattr(r, field)) for r in records])
+                for field in ('science_value', 'isci_value', 'honorary_value')]
+    flags = bytes(FLAG_400_LEVEL if r.is_400_level else 0 for r in records)
+    if sys.byteorder != 'little':
+        for column in columns + [offsets]:
+            column.byteswap()
+
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version.encode('ascii'), n, size)]
+    for column in columns:
+        parts.append(column.tobytes())
+    parts.append(flags + b'\0' * (_align(n) - n))
+    parts.append(offsets.tobytes())
+    parts.append(b''.join(strings))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(tmp_path, path)
+
+
+class CatalogSnapshot:
+    """Read-only memory map of a snapshot file
+
+    The columns and the string table are memoryviews straight into the map,
+    so every process mapping the same file shares those pages through the
+    page cache.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, version, n, size = SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f'{path} is not a catalog snapshot')
+        self.version = version.rstrip(b'\0').decode('ascii')
+        self.count = n
+
+        offset = SNAPSHOT_HEADER.size
+        columns = []
+        for _ in range(4):
+            columns.append(view[offset:offset + 8 * n].cast('d'))
+            offset += 8 * n
+        self.discipline_credit, self.science_value, self.isci_value, self.honorary_value = columns
+        self.flags = view[offset:offset + n]
+        offset += _align(n)
+        self.offsets = view[offset:offset + 4 * (2 * n + 1)].cast('I')
+        offset += 4 * (2 * n + 1)
+        self.strings = view[offset:offset + size]
+        if len(self.strings) != size:
+            raise ValueError(f'{path} is truncated')
+
+    def string(self, i):
+        return str(self.strings[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def courses(self):
+        """A SnapshotCourse per row, in catalog order"""
+        return [SnapshotCourse(self, row, self.string(2 * row)) for row in range(self.count)]
+
+
+class SnapshotCourse:
+    """One row of a mapped snapshot, read like a CourseRecord
+
+    Only the code (the index key) is copied out of the map; every other
+    field is read from the mapped columns when asked for.
+    """
+    __slots__ = ('snapshot', 'row', 'code')
+
+    def __init__(self, snapshot, row, code):
+        self.snapshot = snapshot
+        self.row = row
+        self.code = code
+
+    @property
+    def title(self):
+        return self.snapshot.string(2 * self.row + 1)
+
+    @property
+    def discipline_credit(self):
+        return self.snapshot.discipline_credit[self.row]
+
+    @property
+    def science_value(self):
+        return _resolve(self.snapshot.science_value[self.row])
+
+    @property
+    def isci_value(self):
+        return _resolve(self.snapshot.isci_value[self.row])
+
+    @property
+    def honorary_value(self):
+        return _resolve(self.snapshot.honorary_value[self.row])
+
+    @property
+    def science_credit(self):
+        return self.snapshot.science_value[self.row] > 0
+
+    @property
+    def isci_course(self):
+        return self.snapshot.isci_value[self.row] > 0
+
+    @property
+    def honorary_credit(self):
+        return self.snapshot.honorary_value[self.row] > 0
+
+    @property
+    def is_400_level(self):
+        return bool(self.snapshot.flags[self.row] & FLAG_400_LEVEL)
+
+
+class CourseSearchIndex:
+    """Substring search over course codes and titles
+
+    Built once per catalog. Every row is posted under each 2- and 3-character
+    gram of its lowercased code and title; a query only verifies the rows in
+    the shortest posting list of its grams. Code-prefix matches come from a
+    sorted code list, so ranking (code-prefix matches first, then catalog
+    order) never needs a full sort.
+    """
+
+    MIN_QUERY_LENGTH = 2
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.codes_lower = [record.code.lower() for record in self.records]
+        self.titles_lower = [record.title.lower() for record in self.records]
+
+        postings = {}
+        for row, (code, title) in enumerate(zip(self.codes_lower, self.titles_lower)):
+            grams = set()
+            for text in (code, title):
+                for n in (2, 3):
+                    for i in range(len(text) - n + 1):
+                        grams.add(text[i:i + n])
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+        # Rows are appended in catalog order, so every posting list is sorted
+        self.postings = {gram: tuple(rows) for gram, rows in postings.items()}
+
+        self.sorted_codes = sorted((code, row) for row, code in enumerate(self.codes_lower))
+
+    def _candidates(self, query):
+        if len(query) == 2:
+            return self.postings.get(query, ())
+        shortest = None
+        for i in range(len(query) - 2):
+            rows = self.postings.get(query[i:i + 3])
+            if rows is None:
+                return ()
+            if shortest is None or len(rows) < len(shortest):
+                shortest = rows
+        return shortest
+
+    def _prefix_rows(self, query, limit):
+        start = bisect.bisect_left(self.sorted_codes, (query,))
+        end = start
+        while end < len(self.sorted_codes) and self.sorted_codes[end][0].startswith(query):
+            end += 1
+        return heapq.nsmallest(limit, (row for _, row in self.sorted_codes[start:end]))
+
+    def search(self, query, limit=10):
+        """Return up to limit CourseRecords whose code or title contains query"""
+        query = query.lower()
+        if len(query) < self.MIN_QUERY_LENGTH or limit <= 0:
+            return []
+
+        rows = self._prefix_rows(query, limit)
+        if len(rows) < limit:
+            codes_lower = self.codes_lower
+            titles_lower = self.titles_lower
+            for row in self._candidates(query):
+                code = codes_lower[row]
+                if code.startswith(query):
+                    continue  # already taken as a prefix match
+                if query in code or query in titles_lower[row]:
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+        return [self.records[row] for row in rows]
+
+
+def build_export(catalog):
+    """Serialize and gzip the catalog for client-side search
+
+    One row per course: [code, title, discipline credits or null, flags],
+    with flags a bitmask of EXPORT_FLAGS.
+    """
+    rows = []
+    for record in catalog.index.values():
+        credit = record.discipline_credit
+        if credit != credit:
+            credit = None
+        elif credit == int(credit):
+            credit = int(credit)
+        flags = sum(bit for field, bit in EXPORT_FLAGS if getattr(record, field))
+        rows.append([record.code, record.title, credit, flags])
+    body = json.dumps({
+        'version': catalog.version,
+        'fields': ['code', 'title', 'credits', 'flags'],
+        'flags': dict(EXPORT_FLAGS),
+        'courses': rows,
+    }, separators=(',', ':')).encode('utf-8')
+    # Built once per catalog, so spend the time on the best compression
+    return CatalogExport(catalog.version, body, gzip.compress(body, 9, mtime=0))
+
+
+def file_signature(path):
+    """Cheap change check for courses.csv: modification time and size"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def catalog_version(data):
+    """Content hash of courses.csv, identifying one version of the catalog"""
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+class CourseCatalog:
+    """Course catalog shared by every proposal in the process
+
+    Courses are served from the memory-mapped snapshot compiled from the
+    CSV, so the catalog data itself sits in pages shared by every worker.
+    A missing or stale snapshot is compiled first; if it can't be written
+    or mapped, the courses are parsed from the CSV into this process
+    instead. Read-only after construction.
+    """
+
+    def __init__(self, path=CATALOG_PATH, snapshot_path=None):
+        self.path = path
+        self.snapshot_path = snapshot_path or snapshot_path_for(path)
+
+        # Taken before reading, so a write racing the read shows up as a change
+        self.signature = file_signature(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.version = catalog_version(data)
+
+        self.snapshot = self._map_snapshot(data)
+        if self.snapshot is not None:
+            courses = self.snapshot.courses()
+        else:
+            courses = read_csv_records(data)
+        self.source = 'snapshot' if self.snapshot is not None else 'csv'
+
+        self.index = {course.code: course for course in courses}
+        self.search_index = CourseSearchIndex(self.index.values())
+        self._export = None
+        self._export_lock = threading.Lock()
+
+    def _map_snapshot(self, data):
+        """The snapshot for this catalog version, compiling it if needed; None if unusable"""
+        # Snapshot columns are little-endian and read in place
+        if sys.byteorder != 'little':
+            return None
+        try:
+            snapshot = CatalogSnapshot(self.snapshot_path)
+            if snapshot.version == self.version:
+                return snapshot
+        except (OSError, ValueError, struct.error):
+            pass  # missing or corrupt: compile it
+        try:
+            write_snapshot(read_csv_records(data), self.version, self.snapshot_path)
+            snapshot = CatalogSnapshot(self.snapshot_path)
+            # Another process may have replaced it with another version meanwhile
+            return snapshot if snapshot.version == self.version else None
+        except (OSError, ValueError, struct.error) as e:
+            log.warning('catalog snapshot unusable', extra={'path': self.snapshot_path, 'error': str(e)})
+            return None
+
+    def get(self, course_code):
+        """Return the course (a CourseRecord or SnapshotCourse) for a code, or None"""
+        return self.index.get(course_code)
+
+    def search(self, query, limit=10):
+        return self.search_index.search(query, limit)
+
+    def export(self):
+        """Return the CatalogExport, building it on first use"""
+        if self._export is None:
+            with self._export_lock:
+                if self._export is None:
+                    self._export = build_export(self)
+        return self._export
+
+
+class SearchResultCache:
+    """Size-bounded LRU of serialized search results
+
+    Keys include the catalog version, so results from an older catalog are
+    never served once the catalog changes.
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_search(self, catalog, query, limit=10):
+        """Return the JSON-encoded result list for query, searching on a miss"""
+        key = (catalog.version, query.lower(), limit)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        results = catalog.search(query, limit)
+        serialized = json.dumps([{'code': r.code, 'name': r.title} for r in results], separators=(',', ':'))
+
+        with self._lock:
+            self._entries[key] = serialized
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return serialized
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Search results don't depend on the session, so one cache serves everyone
+search_cache = SearchResultCache()
+
+_catalog = None
+_catalog_lock = threading.Lock()
+# Held while a replacement catalog is built; requests never take it
+_reload_lock = threading.Lock()
+_checked_signature = None
+reload_stats = {'reloads': 0, 'failures': 0}
+
+
+def get_catalog():
+    """Return the process-wide catalog, loading it on first use
+
+    Callers should fetch it once per request and use that object throughout:
+    a reload swaps in a new catalog but never changes an existing one.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CourseCatalog()
+    return _catalog
+
+
+def reload_catalog(force=False):
+    """Swap in a freshly built catalog if courses.csv has changed
+
+    Returns (catalog, status), status being 'reloaded', 'unchanged' or
+    'failed'. Unless forced, a file whose mtime and size haven't changed
+    isn't even read. The new catalog and its search index are built before
+    the swap, which is a single assignment, so requests already holding the
+    old catalog finish on it. A catalog that fails to load leaves the
+    current one in place. Replace courses.csv atomically (write a temporary
+    file, then rename it) so a half-written file is never picked up.
+    """
+    global _catalog, _checked_signature
+    with _reload_lock:
+        current = get_catalog()
+        signature = None
+        try:
+            signature = file_signature(current.path)
+            if not force and signature in (current.signature, _checked_signature):
+                return current, 'unchanged'
+            candidate = CourseCatalog(current.path)
+            if not candidate.index:
+                raise ValueError(f"{current.path} has no courses")
+        except Exception as e:
+            # Don't retry this same file on every poll; the next change will
+            _checked_signature = signature
+            reload_stats['failures'] += 1
+            log.error('catalog reload failed', extra={'version': current.version, 'error': str(e)})
+            return current, 'failed'
+
+        _checked_signature = candidate.signature
+        if candidate.version == current.version:
+            return current, 'unchanged'  # touched but not changed
+
+        with _catalog_lock:
+            _catalog = candidate
+        reload_stats['reloads'] += 1
+        # Keys include the version, so old entries could never be served;
+        # dropping them just frees the space
+        search_cache.clear()
+        log.info('catalog reloaded', extra={'previous_version': current.version, 'version': candidate.version,
+                                            'courses': len(candidate.index)})
+        return candidate, 'reloaded'
+
+
+def start_catalog_watcher(interval):
+    """Check courses.csv for changes every interval seconds on a daemon thread
+
+    Start it in each worker process (after any fork): threads don't survive
+    one.
+    """
+    def watch():
+        while True:
+            time.sleep(interval)
+            reload_catalog()
+
+    thread = threading.Thread(target=watch, name='catalog-watcher', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,36 @@
+# backend/catalog_arrays.py
+"""Catalog columns as NumPy arrays, for the vectorized bulk computations
+
+Kept out of catalog.py so workers that never run one don't load NumPy.
+"""
+import numpy as np
+
+
+class CatalogArrays:
+    """Per-course values of a catalog as NumPy arrays, indexed by catalog row"""
+
+    def __init__(self, catalog):
+        records = list(catalog.index.values())
+        self.version = catalog.version
+        self.row = {record.code: i for i, record in enumerate(records)}
+        self.credit = np.array([r.discipline_credit for r in records], dtype=float)
+        self.is_400_level = np.array([r.is_400_level for r in records], dtype=bool)
+        self.isci_course = np.array([r.isci_course for r in records], dtype=bool)
+        self.isci_credit = np.array([r.isci_value or r.discipline_credit for r in records], dtype=float)
+        self.science_credit = np.array([r.science_credit for r in records], dtype=bool)
+        self.science_value = np.array([r.science_value for r in records], dtype=float)
+        self.honorary_credit = np.array([r.honorary_credit for r in records], dtype=bool)
+        self.honorary_value = np.array([r.honorary_value for r in records], dtype=float)
+        self.isci_449_row = self.row.get("ISCI 449", -1)
+
+
+_arrays = None
+
+
+def get_catalog_arrays(catalog):
+    """Arrays for catalog, rebuilt when the catalog version changes"""
+    global _arrays
+    arrays = _arrays
+    if arrays is None or arrays.version != catalog.version:
+        arrays = _arrays = CatalogArrays(catalog)
+    return arrays
@@ -0,0 +1,87 @@
+# backend/delta.py
+"""Validation results as JSON Patch (RFC 6902) deltas
+
+Validation results depend only on the catalog and the proposal's state, so
+their version is a hash of those. Results are remembered by version in a
+bounded LRU; a client that still holds an earlier version can be sent just
+the operations that turn it into the new one.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def validation_version(catalog_version, state):
+    """Version of the validation results for a serialized proposal state"""
+    return hashlib.sha1(f'{catalog_version}:{state}'.encode('utf-8')).hexdigest()[:16]
+
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def json_patch(old, new, path=''):
+    """Operations turning the dict old into new
+
+    Dicts are compared key by key; anything else that differs, including
+    an int that became an equal float, is replaced whole.
+    """
+    operations = []
+    for key in old:
+        if key not in new:
+            operations.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+    for key, value in new.items():
+        key_path = f'{path}/{_escape(key)}'
+        if key not in old:
+            operations.append({'op': 'add', 'path': key_path, 'value': value})
+            continue
+        before = old[key]
+        if isinstance(before, dict) and isinstance(value, dict):
+            operations.extend(json_patch(before, value, key_path))
+        elif type(before) is not type(value) or before != value:
+            operations.append({'op': 'replace', 'path': key_path, 'value': value})
+    return operations
+
+
+class ValidationHistory:
+    """Size-bounded LRU of validation results by version
+
+    Shared by every session: proposals in the same state share an entry.
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, version, validation):
+        with self._lock:
+            self._entries[version] = validation
+            self._entries.move_to_end(version)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, version):
+        with self._lock:
+            validation = self._entries.get(version)
+            if validation is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(version)
+            self.hits += 1
+            return validation
+
+    def peek(self, version):
+        """Like get, for reusing results rather than diffing against them"""
+        with self._lock:
+            validation = self._entries.get(version)
+            if validation is not None:
+                self._entries.move_to_end(version)
+            return validation
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,189 @@
+# backend/history.py
+"""Version history of a proposal, for undo, redo, snapshots and branches
+
+Each change is recorded as a version holding only the operation that
+produced it from its parent and the operation that takes it back, so
+recording costs O(1) however big the proposal is. Versions form a tree:
+changing the proposal after an undo starts a new branch and the old one
+stays reachable. Moving to any version walks the tree from the current one
+through their common ancestor, undoing and then replaying operations.
+"""
+
+# Versions kept per proposal; the oldest are dropped past this
+MAX_VERSIONS = 100
+
+
+class Version:
+    __slots__ = ('id', 'parent', 'forward', 'inverse', 'redo', 'children')
+
+    def __init__(self, version_id, parent, forward, inverse, redo=None, children=0):
+        self.id = version_id
+        self.parent = parent
+        self.forward = forward    # operation from the parent to this version
+        self.inverse = inverse    # operation from this version back to the parent
+        self.redo = redo          # child that redo moves to
+        self.children = children
+
+
+class ProposalHistory:
+    """Tree of versions, with the current one and named snapshots
+
+    Operations are tuples of a DegreeProposal method name and its
+    arguments; the proposal applies them, this class only decides which.
+    """
+
+    def __init__(self, max_versions=MAX_VERSIONS):
+        self.max_versions = max_versions
+        self.versions = {0: Version(0, None, None, None)}
+        self.root = 0
+        self.current = 0
+        self.next_id = 1
+        self.snapshots = {}  # name -> version id
+
+    def record(self, forward, inverse):
+        """Add a version after the current one and make it current"""
+        parent = self.versions[self.current]
+        version = Version(self.next_id, parent.id, forward, inverse)
+        self.versions[version.id] = version
+        parent.children += 1
+        parent.redo = version.id
+        self.current = version.id
+        self.next_id += 1
+        while len(self.versions) > self.max_versions:
+            self._drop_oldest()
+
+    def path_to(self, target):
+        """[(operation, version reached)] taking the current version to target
+
+        Raises KeyError for a version that isn't (or is no longer) kept.
+        """
+        if target not in self.versions:
+            raise KeyError(target)
+        current_line = set()
+        version_id = self.current
+        while version_id is not None:
+            current_line.add(version_id)
+            version_id = self.versions[version_id].parent
+
+        down = []
+        version_id = target
+        while version_id not in current_line:
+            down.append(self.versions[version_id])
+            version_id = self.versions[version_id].parent
+        common = version_id
+
+        steps = []
+        version_id = self.current
+        while version_id != common:
+            version = self.versions[version_id]
+            steps.append((version.inverse, version.parent))
+            version_id = version.parent
+        for version in reversed(down):
+            steps.append((version.forward, version.id))
+        return steps
+
+    def moved(self, path):
+        """Note that the steps from path_to were applied"""
+        for _, version_id in path:
+            version = self.versions[version_id]
+            if version_id == self.versions[self.current].parent:
+                version.redo = self.current
+            else:
+                self.versions[version.parent].redo = version_id
+            self.current = version_id
+
+    def undo_target(self):
+        return self.versions[self.current].parent
+
+    def redo_target(self):
+        return self.versions[self.current].redo
+
+    def resolve(self, ref):
+        """Version id for a version id or snapshot name, or None"""
+        if isinstance(ref, str) and ref in self.snapshots:
+            return self.snapshots[ref]
+        try:
+            version_id = int(ref)
+        except (TypeError, ValueError):
+            return None
+        return version_id if version_id in self.versions else None
+
+    def snapshot(self, name):
+        self.snapshots[name] = self.current
+        return self.current
+
+    def _drop_oldest(self):
+        """Forget one version that the current one can do without
+
+        The root goes first once the line has moved past it; otherwise the
+        oldest leaf of an abandoned branch. Snapshots of it are forgotten.
+        """
+        root = self.versions[self.root]
+        if root.id != self.current and root.children == 1:
+            child = self.versions[root.redo] if root.redo in self.versions else next(
+                v for v in self.versions.values() if v.parent == root.id)
+            child.parent = child.forward = child.inverse = None
+            self.root = child.id
+            self._forget(root.id)
+            return
+
+        current_line = set()
+        version_id = self.current
+        while version_id is not None:
+            current_line.add(version_id)
+            version_id = self.versions[version_id].parent
+        leaf = min(v.id for v in self.versions.values() if not v.children and v.id not in current_line)
+        version = self.versions[leaf]
+        parent = self.versions[version.parent]
+        parent.children -= 1
+        if parent.redo == leaf:
+            parent.redo = None
+        self._forget(leaf)
+
+    def _forget(self, version_id):
+        del self.versions[version_id]
+        for name in [n for n, v in self.snapshots.items() if v == version_id]:
+            del self.snapshots[name]
+
+    def summary(self):
+        """Every kept version with its parent, operation and snapshot names"""
+        names = {}
+        for name, version_id in self.snapshots.items():
+            names.setdefault(version_id, []).append(name)
+        return [
+            {'version': v.id, 'parent': v.parent, 'operation': list(v.forward) if v.forward else None,
+             'snapshots': names.get(v.id, [])}
+            for v in sorted(self.versions.values(), key=lambda v: v.id)
+        ]
+
+    def copy(self):
+        history = ProposalHistory(self.max_versions)
+        history.versions = {
+            v.id: Version(v.id, v.parent, v.forward, v.inverse, v.redo, v.children) for v in self.versions.values()
+        }
+        history.root = self.root
+        history.current = self.current
+        history.next_id = self.next_id
+        history.snapshots = dict(self.snapshots)
+        return history
+
+    def to_state(self):
+        """JSON-serializable form for the persistent session stores"""
+        return {
+            'r': self.root, 'c': self.current, 'n': self.next_id, 's': self.snapshots,
+            'v': [[v.id, v.parent, v.forward, v.inverse, v.redo, v.children] for v in self.versions.values()]
+        }
+
+    @classmethod
+    def from_state(cls, state, max_versions=MAX_VERSIONS):
+        history = cls(max_versions)
+        history.versions = {
+            row[0]: Version(row[0], row[1], tuple(row[2]) if row[2] else None,
+                            tuple(row[3]) if row[3] else None, row[4], row[5])
+            for row in state['v']
+        }
+        history.root = state['r']
+        history.current = state['c']
+        history.next_id = state['n']
+        history.snapshots = dict(state['s'])
+        return history
@@ -0,0 +1,201 @@
+# backend/impact.py
+"""What adding each of many candidate courses would do to a proposal
+
+Every candidate goes into the same discipline of the same proposal, so
+only that discipline's totals differ between them. Its new totals, the
+proposal-wide metrics and every requirement check are computed for all
+candidates at once as NumPy arrays over their catalog rows, following the
+same order of additions as validate_proposal so the numbers match exactly.
+"""
+import numpy as np
+
+from catalog_arrays import get_catalog_arrays
+
+
+def _honorary_used(proposal, discipline_name, values, cap):
+    """Honorary credits counted towards science with values added to discipline_name
+
+    A new course joins the end of its discipline's honorary list, so every
+    candidate is tried at the same place in the ordered cap.
+    """
+    before, after = [], []
+    after_target = False
+    for discipline in proposal.discipline_order:
+        if discipline == "ISCI" or discipline not in proposal.disciplines:
+            continue
+        courses = proposal.totals[discipline].honorary_courses
+        (after if after_target else before).extend(credit for _, credit in courses)
+        if discipline == discipline_name:
+            after_target = True
+
+    used = 0
+    for credit in before:
+        if used + credit <= cap:
+            used += credit
+    used = np.full(len(values), used, dtype=float)
+    used = np.where((values > 0) & (used + values <= cap), used + values, used)
+    for credit in after:
+        used = np.where(used + credit <= cap, used + credit, used)
+    return used
+
+
+def _new_totals(proposal, discipline_name, rows, arrays, max_honorary_credits):
+    """Metric arrays after adding each row, plus the target discipline's new totals"""
+    n = len(rows)
+    target = proposal.totals[discipline_name]
+    credit = arrays.credit[rows]
+    is_400 = arrays.is_400_level[rows]
+
+    # The target discipline's totals, as DisciplineTotals.add would leave them
+    discipline_credits = np.full(n, np.nan) if target.unknown_credits else target.credits + credit
+    level_400_count = target.level_400_count + is_400
+    if target.unknown_level_400_credits:
+        discipline_400 = np.full(n, np.nan)
+    else:
+        discipline_400 = np.where(is_400, target.level_400_credits + credit, target.level_400_credits)
+    discipline_400 = np.where(level_400_count > 0, discipline_400, 0.0)
+
+    has_isci_449 = np.full(n, proposal.course_owner.get("ISCI 449") == "ISCI")
+    if discipline_name == "ISCI":
+        isci_credits = np.full(n, target.isci_credits) + arrays.isci_credit[rows]
+        honorary = np.zeros(n, dtype=bool)
+        science = np.zeros(n, dtype=bool)
+        has_isci_449 |= rows == arrays.isci_449_row
+    else:
+        honorary = arrays.honorary_credit[rows]
+        science = ~honorary & arrays.science_credit[rows]
+    science_count = target.science_count + science
+    science_credits = np.where(science, target.science_credits + arrays.science_value[rows],
+                               target.science_credits)
+    honorary_values = np.where(honorary, arrays.honorary_value[rows], 0.0)
+
+    # Proposal-wide sums, in discipline order like credit_aggregates
+    total_credits = 0
+    total_400_level_credits = 0
+    pure_science = 0
+    isci_science = 0
+    honorary_available = 0
+    for discipline in proposal.discipline_order:
+        if discipline not in proposal.disciplines:
+            continue
+        totals = proposal.totals[discipline]
+        if discipline == discipline_name:
+            if discipline == "ISCI":
+                isci_science = isci_science + isci_credits
+                continue
+            total_credits = total_credits + discipline_credits
+            total_400_level_credits = total_400_level_credits + np.where(level_400_count > 0, discipline_400, 0.0)
+            pure_science = pure_science + np.where(science_count > 0, science_credits, 0.0)
+            for _, credit in totals.honorary_courses:
+                honorary_available = honorary_available + credit
+            honorary_available = honorary_available + honorary_values
+        elif discipline != "ISCI":
+            total_credits += totals.credit_total()
+            if totals.level_400_count:
+                total_400_level_credits += totals.level_400_total()
+            if totals.science_count:
+                pure_science += totals.science_credits
+            for _, credit in totals.honorary_courses:
+                honorary_available += credit
+        elif totals.isci_count:
+            isci_science += totals.isci_credits
+
+    honorary_used = _honorary_used(proposal, discipline_name, honorary_values, max_honorary_credits)
+    metrics = {
+        'discipline_count': sum(1 for d in proposal.discipline_order if d != "ISCI" and d in proposal.disciplines),
+        'isci_credits': isci_science,
+        'total_credits': total_credits,
+        'science_credits': isci_science + pure_science + honorary_used,
+        'non_isci_science_credits': pure_science + honorary_used,
+        'honorary_credits': honorary_available,
+        'total_400_level_credits': total_400_level_credits,
+    }
+    return ({name: np.broadcast_to(np.asarray(value, dtype=float), (n,)) for name, value in metrics.items()},
+            discipline_credits, discipline_400, has_isci_449)
+
+
+def score_candidates(proposal, discipline_name, course_codes, plan):
+    """One impact dict per code, in order, for adding it to discipline_name
+
+    The proposal is only read. Codes add_course would refuse (unknown,
+    already in the proposal, or non-ISCI courses for ISCI) come back with
+    allowed False and a reason. For the rest, changes maps each requirement
+    whose actual value moves to the amount, and met/unmet list requirements
+    whose status flips; course_count and has_400_level are the target
+    discipline's own requirements.
+    """
+    arrays = get_catalog_arrays(proposal.catalog)
+    impacts = [None] * len(course_codes)
+    positions = []
+    rows = []
+    for i, code in enumerate(course_codes):
+        row = arrays.row.get(code)
+        if row is None:
+            reason = 'Course not found'
+        elif code in proposal.course_owner:
+            reason = f"Already in {proposal.course_owner[code]}"
+        elif discipline_name == "ISCI" and not arrays.isci_course[row]:
+            reason = 'Only ISCI courses can be added to the ISCI discipline'
+        else:
+            positions.append(i)
+            rows.append(row)
+            continue
+        impacts[i] = {'code': code, 'allowed': False, 'reason': reason}
+    if not rows:
+        return impacts
+
+    rows = np.array(rows, dtype=np.intp)
+    before = plan.evaluate(*proposal.credit_aggregates())
+    requirements = before['requirements']
+    metrics, discipline_credits, discipline_400, has_isci_449 = _new_totals(
+        proposal, discipline_name, rows, arrays, plan.max_honorary_credits)
+
+    # Every check that can change, as (name, actual before, met before, actual after, met after)
+    checks = []
+    success = np.ones(len(rows), dtype=bool)
+    for requirement, metric, minimum, maximum, _, message, _ in plan.checks:
+        actual = metrics[metric]
+        met = np.ones(len(rows), dtype=bool)
+        if minimum is not None:
+            met &= actual >= minimum
+        if maximum is not None:
+            met &= actual <= maximum
+        checks.append((requirement, requirements[requirement]['actual'], requirements[requirement]['met'],
+                       actual, met))
+        if message is not None:
+            success &= met
+
+    missing_isci_449 = ~has_isci_449 if plan.require_isci_449 else np.zeros(len(rows), dtype=bool)
+    success &= ~missing_isci_449
+    is_isci = discipline_name == "ISCI"
+    min_credits = plan.isci_min_credits if is_isci else plan.discipline_min_credits
+    course_count_met = discipline_credits >= min_credits
+    if is_isci:
+        course_count_met &= ~missing_isci_449
+    has_400_level_met = np.ones(len(rows), dtype=bool) if is_isci else discipline_400 > 0
+    own = requirements['disciplines_requirements'][discipline_name]
+    checks.append(('course_count', own['course_count']['actual'], own['course_count']['met'],
+                   discipline_credits, course_count_met))
+    checks.append(('has_400_level', None, own['has_400_level']['met'], None, has_400_level_met))
+    success &= course_count_met & has_400_level_met
+    # Other disciplines are untouched (ISCI 449 only counts in ISCI itself)
+    for discipline, status in requirements['disciplines_requirements'].items():
+        if discipline != discipline_name:
+            success &= status['course_count']['met'] and status['has_400_level']['met']
+
+    # Scatter the per-check arrays into one dict per candidate
+    scored = [
+        {'code': course_codes[i], 'allowed': True, 'changes': {}, 'met': [], 'unmet': [], 'success': passes}
+        for i, passes in zip(positions, success.tolist())
+    ]
+    for name, actual_before, met_before, actual_after, met_after in checks:
+        if actual_after is not None:
+            moved = ~((actual_after == actual_before) | (np.isnan(actual_after) & (actual_before != actual_before)))
+            for k, change in zip(np.flatnonzero(moved).tolist(), (actual_after[moved] - actual_before).tolist()):
+                scored[k]['changes'][name] = None if change != change else change
+        flipped = 'unmet' if met_before else 'met'
+        for k in np.flatnonzero(met_after != met_before).tolist():
+            scored[k][flipped].append(name)
+    for i, impact in zip(positions, scored):
+        impacts[i] = impact
+    return impacts
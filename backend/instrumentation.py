@@ -0,0 +1,174 @@
+# backend/instrumentation.py
+"""Request timing, Server-Timing headers, Prometheus metrics and a sampling profiler"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# Latency buckets in seconds, fine-grained at the low end where this app lives
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Sampling profiler: opt in with PROFILING_ENABLED=1, then per request with
+# ?profile=1 or an X-Profile: 1 header
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp')
+PROFILE_INTERVAL = 0.001
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            label_text = ','.join(f'{n}="{v}"' for n, v in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            for bound, count in zip(BUCKETS, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series[-2]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series[-1]:.6f}')
+        return lines
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request', ('endpoint', 'method', 'status'))
+phase_duration = Histogram(
+    'request_phase_duration_seconds', 'Time spent in one phase of a request', ('endpoint', 'phase'))
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to the current request's phase timings"""
+    if not has_request_context() or 'timings' not in g:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.timings[phase] = g.timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Counts time spent serializing responses as the 'serialize' phase"""
+
+    def response(self, *args, **kwargs):
+        with timed('serialize'):
+            return super().response(*args, **kwargs)
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self, path):
+        """Stop sampling and write folded stacks (flamegraph.pl input) to path"""
+        self._stop.set()
+        self._thread.join()
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f'{stack} {count}\n')
+
+
+def _wants_profile():
+    return PROFILING_ENABLED and (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1')
+
+
+def init_app(app):
+    """Time every request and emit Server-Timing headers"""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timing():
+        g.timings = {}
+        g.request_start = time.perf_counter()
+        g.profiler = None
+        if _wants_profile():
+            g.profiler = SamplingProfiler(threading.get_ident())
+            g.profiler.start()
+
+    @app.after_request
+    def finish_timing(response):
+        if 'request_start' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        endpoint = request.endpoint or 'unknown'
+        request_duration.observe((endpoint, request.method, str(response.status_code)), total)
+
+        entries = []
+        for phase, duration in g.timings.items():
+            phase_duration.observe((endpoint, phase), duration)
+            entries.append(f'{phase};dur={duration * 1000:.3f}')
+        entries.append(f'total;dur={total * 1000:.3f}')
+
+        if g.profiler is not None:
+            path = os.path.join(PROFILE_DIR, f'profile-{endpoint}-{int(time.time() * 1000)}.folded')
+            g.profiler.stop(path)
+            g.profiler = None
+            entries.append(f'profile;desc="{os.path.basename(path)}"')
+
+        response.headers['Server-Timing'] = ', '.join(entries)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # after_request doesn't run for unhandled errors; don't leak the sampler
+        profiler = g.get('profiler')
+        if profiler is not None:
+            profiler._stop.set()
+
+
+def render_metrics(gauges, counters):
+    """Prometheus text exposition of the histograms plus the given values"""
+    lines = request_duration.render() + phase_duration.render()
+    for name, (help_text, value) in sorted(gauges.items()):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    for name, (help_text, value) in sorted(counters.items()):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,193 @@
+# backend/logs.py
+"""Structured JSON logging that never blocks a request
+
+Records are queued by the thread that logs them and written by a
+background thread, so a slow log sink can't stall a worker. A full queue
+drops records instead of waiting. On the way in, each record is tagged
+with the request and session it came from, DEBUG (or any level) can be
+sampled, and WARNING and above are rate limited per message.
+
+Log with a fixed message and the variable parts as extra fields:
+
+    log.info('catalog reloaded', extra={'version': version})
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG').upper()
+# Share of records kept per level, e.g. "DEBUG=0.01,INFO=1"
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', 'DEBUG=0.01')
+# Records of one message at WARNING and above allowed per interval
+LOG_RATE_LIMIT = int(os.environ.get('LOG_RATE_LIMIT', 10))
+LOG_RATE_INTERVAL = float(os.environ.get('LOG_RATE_INTERVAL', 60))
+LOG_QUEUE_SIZE = 10000
+
+# Counted for /metrics
+stats = {'dropped': 0, 'sampled_out': 0, 'rate_limited': 0}
+
+# LogRecord's own attributes; anything else on a record is an extra field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def parse_sample_rates(text):
+    rates = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        level, _, rate = part.partition('=')
+        rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with extra fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """Keep only a share of the records at each sampled level"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        stats['sampled_out'] += 1
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """At most limit records per logger and message per interval, from WARNING up
+
+    The first record let through after some were held back says how many
+    in its suppressed field.
+    """
+
+    MAX_KEYS = 1000
+
+    def __init__(self, limit, interval):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}  # (logger, level, message) -> [start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self._windows) >= self.MAX_KEYS:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                return True
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            window[2] += 1
+            stats['rate_limited'] += 1
+            return False
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the request and session they were logged from"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.session_id = g.get('session_id') or request.args.get('session')
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them; drops them when the queue is full"""
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, while the arguments are current
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats['dropped'] += 1
+
+
+_listener = None
+
+
+def configure():
+    """Route the root logger through the queue; the writer thread starts here"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter())
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    # Cheapest rejections first, so dropped records cost the least
+    handler.addFilter(SampleFilter(parse_sample_rates(LOG_SAMPLE)))
+    handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_INTERVAL))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def init_app(app):
+    """Give every request an id (X-Request-ID, taken from the client if sent)"""
+    configure()
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+
+    @app.after_request
+    def send_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
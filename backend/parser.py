@@ -1,9 +1,23 @@
 # backend/app.py
-from flask import Flask, request, jsonify
-import pandas as pd
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
+from admission import RateLimited, admit_new_session, init_app as init_admission, search_coalescer, stats as admission_stats
+from catalog import get_catalog, reload_catalog, reload_stats, search_cache, start_catalog_watcher
+from compression import init_app as init_compression
+from delta import ValidationHistory, json_patch, validation_version
+from history import ProposalHistory
+from session_store import SessionConflict, create_session_store
+from suggest import suggest_completion
+from instrumentation import init_app as init_instrumentation, render_metrics, timed
+from logs import init_app as init_logging, stats as log_stats
+from tokens import InvalidToken, ProposalTokens
+from rules import DEFAULT_STREAM, PLANS, get_plan
+import hmac
+import json
+import logging
+import os
+import threading
 import uuid
-import time
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -17,79 +31,468 @@ CORS(app, resources={
             "https://www.isciplanner.com" # New domain with www
         ],
         "methods": ["GET", "POST", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept"],
+        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept", "X-Validation-Base", "X-Proposal-Token"],
         "supports_credentials": True,
-        "expose_headers": ["Content-Type"]
+        "expose_headers": ["Content-Type", "Server-Timing", "ETag", "X-Proposal-Token", "X-Request-ID", "Retry-After"]
     }
 })
+# Per-phase request timings, Server-Timing headers and /metrics histograms
+init_instrumentation(app)
+# Gzip large responses (after instrumentation, so it's timed)
+init_compression(app)
+# Queued JSON logs tagged with request and session ids
+init_logging(app)
+log = logging.getLogger(__name__)
+# Per-IP and per-session rate limits (before anything below does real work)
+init_admission(app)
 
-# Dictionary to store user proposals by session ID
-user_proposals = {}
-# Track last activity time for cleanup
-last_activity = {}
 # Session timeout (24 hours)
 SESSION_TIMEOUT = 86400
+# Hard cap on in-memory sessions; the least recently used one is evicted
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 10000))
+# Seconds between checks of courses.csv for changes (0 turns polling off)
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 10))
+# Seconds clients and CDNs may reuse /catalog without revalidating
+CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', 300))
+# Versions of each proposal kept for undo, redo and snapshots
+MAX_PROPOSAL_VERSIONS = int(os.environ.get('MAX_PROPOSAL_VERSIONS', 50))
+# Bearer token for /admin endpoints; they don't exist without one
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+# Stateless mode: with a secret, a request may carry its proposal in a signed
+# X-Proposal-Token header (or ?token=) instead of a session, and gets the
+# updated token back in the same header. STATELESS=1 never creates sessions.
+PROPOSAL_TOKEN_SECRET = os.environ.get('PROPOSAL_TOKEN_SECRET')
+STATELESS = os.environ.get('STATELESS') == '1'
+if STATELESS and not PROPOSAL_TOKEN_SECRET:
+    raise RuntimeError("STATELESS=1 needs PROPOSAL_TOKEN_SECRET")
+proposal_tokens = ProposalTokens(PROPOSAL_TOKEN_SECRET) if PROPOSAL_TOKEN_SECRET else None
 
 def get_user_proposal(session_id=None):
     """Get or create a proposal for the session"""
-    # Use provided session ID or generate a new one
-    if not session_id:
-        session_id = str(uuid.uuid4())
-    
-    # Create new proposal if needed
-    if session_id not in user_proposals:
-        user_proposals[session_id] = DegreeProposal()
-    
-    # Update last activity time
-    last_activity[session_id] = time.time()
-    
-    # Clean up inactive sessions occasionally
-    if len(user_proposals) > 300 or (time.time() % 3600 < 10):
+    if 'token_proposal' in g:
+        return session_id, g.token_proposal
+    with timed('session'):
+        # Use provided session ID or generate a new one
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        # For the log correlation ids
+        g.session_id = session_id
+        
+        # The whole request works against this catalog, even if a reload
+        # swaps in a new one meanwhile
+        catalog = get_catalog()
+        
+        # Load the proposal (this also counts as activity), create it if needed.
+        # The version it was loaded at goes back with the save, so a change
+        # another worker made in between is refused rather than overwritten
+        for attempt in range(3):
+            proposal, version = session_store.get(session_id)
+            try:
+                if proposal is None:
+                    if not attempt:
+                        admit_new_session()
+                    proposal = DegreeProposal(catalog)
+                    version = session_store.put(session_id, proposal)
+                elif proposal.catalog is not catalog:
+                    # Loaded before the last catalog reload: move it onto the new one
+                    proposal = proposal.rebind(catalog)
+                    version = session_store.put(session_id, proposal, version)
+                break
+            except SessionConflict:
+                # Another worker created or rebound it first: load theirs
+                if attempt == 2:
+                    raise
+        g.session_version = version
+        
+        # Expire idle sessions; cheap enough to run on every request
         cleanup_inactive_sessions()
         
-    return session_id, user_proposals[session_id]
+    return session_id, proposal
+
+# Requests for the same session run one at a time so a read-modify-write
+# never interleaves with another; locks are striped by session id so the
+# table stays a fixed size however many sessions there are
+SESSION_LOCK_STRIPES = 256
+_session_locks = [threading.Lock() for _ in range(SESSION_LOCK_STRIPES)]
+# Endpoints that never read or write session state
+UNLOCKED_ENDPOINTS = {'search_courses', 'catalog_export', 'metrics', 'admin_reload_catalog'}
+# Endpoints working on version history, which tokens don't carry
+HISTORY_ENDPOINTS = {
+    'undo_change', 'redo_change', 'checkout_version', 'create_snapshot', 'get_proposal_history', 'compare_versions'
+}
+
+@app.before_request
+def load_proposal_token():
+    """Decode the proposal a stateless request carries"""
+    if proposal_tokens is None or request.endpoint in UNLOCKED_ENDPOINTS:
+        return
+    token = request.headers.get('X-Proposal-Token') or request.args.get('token')
+    if token or STATELESS:
+        if request.endpoint in HISTORY_ENDPOINTS:
+            raise InvalidToken("Version history isn't available in stateless mode")
+        catalog = get_catalog()
+        with timed('session'):
+            if token:
+                g.token_proposal = DegreeProposal.from_state(proposal_tokens.decode(token, catalog), catalog)
+            else:
+                g.token_proposal = DegreeProposal(catalog)
+
+@app.after_request
+def send_proposal_token(response):
+    proposal = g.get('token_proposal')
+    if proposal is not None:
+        with timed('session'):
+            response.headers['X-Proposal-Token'] = proposal_tokens.encode(
+                proposal.stream, [(d, proposal.disciplines[d]) for d in proposal.discipline_order])
+    return response
+
+@app.errorhandler(InvalidToken)
+def invalid_token(e):
+    return jsonify({
+        'success': False,
+        'message': str(e)
+    }), e.status
+
+@app.errorhandler(SessionConflict)
+def session_conflict(e):
+    # Another worker saved this session after this request loaded it
+    log.warning('session changed concurrently')
+    return jsonify({
+        'success': False,
+        'message': 'Your proposal was changed by another request, reload it and try again',
+        'session_id': request.args.get('session')
+    }), 409
+
+@app.before_request
+def lock_session():
+    # Token requests share nothing, so there's nothing to lock
+    session_id = request.args.get('session')
+    if session_id and request.endpoint not in UNLOCKED_ENDPOINTS and 'token_proposal' not in g:
+        lock = _session_locks[hash(session_id) % SESSION_LOCK_STRIPES]
+        with timed('lock'):
+            lock.acquire()
+        g.session_lock = lock
+
+@app.teardown_request
+def unlock_session(exc):
+    lock = g.pop('session_lock', None)
+    if lock is not None:
+        lock.release()
+
+# Validation results recently sent, for delta responses against them
+validation_history = ValidationHistory()
+
+def remember_validation(proposal, validation):
+    """Record validation results for later deltas and return their version"""
+    version = validation_version(proposal.catalog.version, proposal.to_json())
+    validation_history.remember(version, validation)
+    return version
+
+def validation_fields(proposal, validation):
+    """The validation part of a mutation response
+
+    Every response carries the validation_version of its results. A client
+    that sends the version it holds back as an X-Validation-Base header (or
+    validation_base parameter) gets validation_patch, the JSON Patch from
+    those results, instead of the full validation. If this worker no longer
+    has them it falls back to the full results.
+    """
+    version = remember_validation(proposal, validation)
+    base = request.headers.get('X-Validation-Base') or request.args.get('validation_base')
+    if base:
+        previous = validation_history.get(base)
+        if previous is not None:
+            return {
+                'validation_patch': json_patch(previous, validation),
+                'validation_base': base,
+                'validation_version': version
+            }
+    return {'validation': validation, 'validation_version': version}
+
+def cached_validation(proposal):
+    """Validation results for the proposal's state, reused if any version had them"""
+    version = validation_version(proposal.catalog.version, proposal.to_json())
+    results = validation_history.peek(version)
+    if results is None:
+        with timed('validate'):
+            results = proposal.validate_proposal()
+        validation_history.remember(version, results)
+    return results
+
+def save_user_proposal(session_id, proposal):
+    """Write a modified proposal back to the session store"""
+    if 'token_proposal' in g:
+        # Sent back as the response's X-Proposal-Token
+        g.token_proposal = proposal
+        return
+    with timed('session'):
+        g.session_version = session_store.put(session_id, proposal, g.get('session_version'))
 
 def cleanup_inactive_sessions():
     """Remove inactive sessions"""
-    current_time = time.time()
-    inactive_ids = [
-        session_id for session_id, last_time in last_activity.items()
-        if current_time - last_time > SESSION_TIMEOUT
-    ]
-    
-    for session_id in inactive_ids:
-        if session_id in user_proposals:
-            del user_proposals[session_id]
-        if session_id in last_activity:
-            del last_activity[session_id]
+    return session_store.cleanup_inactive(SESSION_TIMEOUT)
+
+def build_validation_results(stream, discipline_credits, has_isci_449, total_credits,
+                             isci_science_credits, pure_non_isci_science_credits,
+                             honorary_credits_used, honorary_credits_available,
+                             total_400_level_credits):
+    """Check aggregated credit totals against the stream requirements
+
+    discipline_credits lists (discipline, credits, 400-level credits) in
+    discipline order. Shared by validate_proposal and bulk validation so
+    both produce exactly the same results.
+    """
+    plan = get_plan(stream)
+    results = plan.evaluate(
+        discipline_credits, has_isci_449, total_credits,
+        isci_science_credits, pure_non_isci_science_credits,
+        honorary_credits_used, honorary_credits_available, total_400_level_credits
+    )
+    if stream != plan.stream:
+        # Unknown streams are checked as the default one but keep their name
+        results['stream'] = stream
+    return results
+
+class DisciplineTotals:
+    """Running credit totals for one discipline of a proposal
+
+    Updated by delta on every add/remove so validate_proposal never has to
+    walk the course lists. Counts are kept next to each sum so an empty
+    total reports 0 exactly like the original loop did, and NaN catalog
+    credits are counted separately so they can be removed again.
+    """
+    __slots__ = (
+        'is_isci', 'course_count', 'credits', 'unknown_credits',
+        'level_400_count', 'level_400_credits', 'unknown_level_400_credits',
+        'isci_count', 'isci_credits', 'science_count', 'science_credits',
+        'honorary_courses'
+    )
+
+    def __init__(self, is_isci):
+        self.is_isci = is_isci
+        self.course_count = 0
+        self.credits = 0.0
+        self.unknown_credits = 0
+        self.level_400_count = 0
+        self.level_400_credits = 0.0
+        self.unknown_level_400_credits = 0
+        self.isci_count = 0
+        self.isci_credits = 0.0
+        self.science_count = 0
+        self.science_credits = 0.0
+        # (course_code, honorary_value) in course order, for the honorary cap
+        self.honorary_courses = []
+
+    def add(self, record, sign=1):
+        """Apply one course (sign=1) or take it back out (sign=-1)"""
+        credit = record.discipline_credit
+        self.course_count += sign
+        if credit != credit:  # NaN
+            self.unknown_credits += sign
+        else:
+            self.credits += sign * credit
+
+        if record.is_400_level:
+            self.level_400_count += sign
+            if credit != credit:
+                self.unknown_level_400_credits += sign
+            else:
+                self.level_400_credits += sign * credit
+
+        if self.is_isci:
+            if record.isci_course:
+                self.isci_count += sign
+                self.isci_credits += sign * (record.isci_value or credit)
+        else:
+            # A course is either honorary or pure science, never both
+            if record.honorary_credit:
+                if sign > 0:
+                    self.honorary_courses.append((record.code, record.honorary_value))
+                else:
+                    self.honorary_courses.remove((record.code, record.honorary_value))
+            elif record.science_credit:
+                self.science_count += sign
+                self.science_credits += sign * record.science_value
+
+    def credit_total(self):
+        if not self.course_count:
+            return 0
+        return float('nan') if self.unknown_credits else self.credits
+
+    def level_400_total(self):
+        if not self.level_400_count:
+            return 0
+        return float('nan') if self.unknown_level_400_credits else self.level_400_credits
+
 
 class DegreeProposal:
-    def __init__(self):
+    # Sessions only hold their own selections; the catalog is shared
+    __slots__ = ('catalog', 'stream', 'disciplines', 'discipline_order', 'totals', 'course_owner', 'history')
+
+    def __init__(self, catalog=None):
         try:
-            # Read CSV and strip whitespace from column names
-            self.courses_df = pd.read_csv('courses.csv')
-            self.courses_df.columns = self.courses_df.columns.str.strip()
-            
-            # Convert columns to appropriate types
-            self.courses_df['Course'] = self.courses_df['Course'].astype(str)
-            self.courses_df['Course_code'] = self.courses_df['Course_code'].astype(str)
-            self.courses_df['Title'] = self.courses_df['Title'].astype(str)
+            self.catalog = catalog if catalog is not None else get_catalog()
             
-            # Set default stream to regular
-            self.stream = "regular"
+            self.stream = DEFAULT_STREAM
+            self.history = None
             self.reset_proposal()
-        except Exception as e:
-            print(f"Error initializing DegreeProposal: {str(e)}")
+            self.history = ProposalHistory(MAX_PROPOSAL_VERSIONS)
+        except Exception:
+            log.exception('proposal initialization failed')
             raise
+
+    def to_json(self):
+        """Compact serialized form of the proposal's current state"""
+        return json.dumps({
+            's': self.stream,
+            'd': [[d, self.disciplines[d]] for d in self.discipline_order]
+        }, separators=(',', ':'))
+
+    def to_session_json(self):
+        """to_json plus the version history and the catalog version it was
+        recorded against, used by the persistent session stores"""
+        return json.dumps({
+            's': self.stream,
+            'd': [[d, self.disciplines[d]] for d in self.discipline_order],
+            'v': self.catalog.version,
+            'h': self.history.to_state()
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data, catalog=None):
+        return cls.from_state(json.loads(data), catalog)
+
+    @classmethod
+    def from_state(cls, state, catalog=None):
+        """Proposal from the decoded to_json / to_session_json form"""
+        proposal = cls(catalog)
+        proposal.stream = state['s']
+        course_index = proposal.catalog.index
+        # Courses that have since left the catalog are dropped
+        proposal.disciplines = {
+            d: [c for c in courses if c in course_index] for d, courses in state['d']
+        }
+        proposal.discipline_order = [d for d, _ in state['d']]
+        proposal.rebuild_totals()
+        # Like rebind, history starts afresh on another catalog version
+        if 'h' in state and state.get('v') == proposal.catalog.version:
+            proposal.history = ProposalHistory.from_state(state['h'], MAX_PROPOSAL_VERSIONS)
+        return proposal
         
+    def rebind(self, catalog):
+        """Copy of this proposal on another catalog version
+
+        Totals are rebuilt from the new catalog's values, and courses it no
+        longer lists are dropped. History starts afresh, since recorded
+        operations may refer to dropped courses.
+        """
+        return DegreeProposal.from_json(self.to_json(), catalog)
+
+    def _record(self, forward, inverse):
+        # history is None while operations are being replayed
+        if self.history is not None:
+            self.history.record(forward, inverse)
+
+    def _state(self):
+        return (self.stream, tuple((d, tuple(self.disciplines[d])) for d in self.discipline_order))
+
+    def _restore_state(self, state):
+        """Inverse of reset_proposal"""
+        self.stream, disciplines = state
+        self.disciplines = {d: list(courses) for d, courses in disciplines}
+        self.discipline_order = [d for d, _ in disciplines]
+        self.rebuild_totals()
+
+    def _restore_discipline(self, discipline_name, index, courses):
+        """Inverse of remove_discipline"""
+        self.disciplines[discipline_name] = list(courses)
+        self.discipline_order.insert(index, discipline_name)
+        self._rebuild_discipline(discipline_name)
+
+    def _insert_course(self, discipline_name, course_code, index):
+        """Inverse of remove_course: put it back where it was"""
+        self.disciplines[discipline_name].insert(index, course_code)
+        self._rebuild_discipline(discipline_name)
+
+    def _rebuild_discipline(self, discipline_name):
+        # Honorary credits are capped in course order, so rebuild rather than append
+        totals = DisciplineTotals(is_isci=discipline_name == "ISCI")
+        for course_code in self.disciplines[discipline_name]:
+            totals.add(self.catalog.index[course_code])
+            self.course_owner[course_code] = discipline_name
+        self.totals[discipline_name] = totals
+
+    # Operations a version can record, forward or inverse
+    OPERATIONS = {
+        'add_discipline', 'remove_discipline', 'add_course', 'remove_course', 'set_stream',
+        'reset_proposal', '_restore_state', '_restore_discipline', '_insert_course'
+    }
+
+    def _apply(self, operation):
+        name, *args = operation
+        if name not in self.OPERATIONS:
+            raise ValueError(f"Unknown operation in history: {name}")
+        history, self.history = self.history, None
+        try:
+            getattr(self, name)(*args)
+        finally:
+            self.history = history
+
+    def checkout(self, version):
+        """Move to a version (id or snapshot name); False if it isn't kept"""
+        version_id = self.history.resolve(version)
+        if version_id is None:
+            return False
+        path = self.history.path_to(version_id)
+        for operation, _ in path:
+            self._apply(operation)
+        self.history.moved(path)
+        return True
+
+    def undo(self):
+        target = self.history.undo_target()
+        return target is not None and self.checkout(target)
+
+    def redo(self):
+        target = self.history.redo_target()
+        return target is not None and self.checkout(target)
+
     def reset_proposal(self):
+        if self.history is not None:
+            self._record(('reset_proposal',), ('_restore_state', self._state()))
         # Reset to initial state with only ISCI discipline
         self.disciplines = {"ISCI": []}
         self.discipline_order = ["ISCI"]  # Track order explicitly
+        self.totals = {"ISCI": DisciplineTotals(is_isci=True)}
+        self.course_owner = {}  # course_code -> discipline holding it
+
+    def rebuild_totals(self):
+        """Recompute the running totals from the course lists from scratch"""
+        self.totals = {}
+        self.course_owner = {}
+        course_index = self.catalog.index
+        for discipline in self.discipline_order:
+            totals = DisciplineTotals(is_isci=discipline == "ISCI")
+            for course_code in self.disciplines[discipline]:
+                totals.add(course_index[course_code])
+                self.course_owner[course_code] = discipline
+            self.totals[discipline] = totals
+
+    def copy(self):
+        """Independent copy sharing only the catalog"""
+        proposal = DegreeProposal(self.catalog)
+        proposal.stream = self.stream
+        proposal.disciplines = {d: list(courses) for d, courses in self.disciplines.items()}
+        proposal.discipline_order = list(self.discipline_order)
+        proposal.rebuild_totals()
+        proposal.history = self.history.copy()
+        return proposal
     
     def set_stream(self, stream):
-        """Set the degree stream (regular or honours)"""
-        if stream in ["regular", "honours"]:
+        """Set the degree stream (any stream in degree_rules.json)"""
+        if stream in PLANS:
+            if stream != self.stream:
+                self._record(('set_stream', stream), ('set_stream', self.stream))
             self.stream = stream
             return True
         return False
@@ -98,293 +501,148 @@ class DegreeProposal:
         if discipline_name not in self.disciplines:
             self.disciplines[discipline_name] = []
             self.discipline_order.append(discipline_name)  # Add to order
+            self.totals[discipline_name] = DisciplineTotals(is_isci=discipline_name == "ISCI")
+            self._record(('add_discipline', discipline_name), ('remove_discipline', discipline_name))
             return True
         return False
     
     def remove_discipline(self, discipline_name):
-        print(f"Attempting to remove discipline: '{discipline_name}'")
-        print(f"Current disciplines: {list(self.disciplines.keys())}")
-        
         if discipline_name != "ISCI" and discipline_name in self.disciplines:
+            self._record(('remove_discipline', discipline_name), (
+                '_restore_discipline', discipline_name,
+                self.discipline_order.index(discipline_name), tuple(self.disciplines[discipline_name])
+            ))
+            for course_code in self.disciplines[discipline_name]:
+                del self.course_owner[course_code]
             del self.disciplines[discipline_name]
+            del self.totals[discipline_name]
             self.discipline_order.remove(discipline_name)  # Remove from order
-            print(f"Discipline '{discipline_name}' successfully removed")
-            print(f"Disciplines after removal: {list(self.disciplines.keys())}")
+            log.debug('discipline removed', extra={
+                'discipline': discipline_name, 'disciplines': list(self.discipline_order)})
             return True
         
-        print(f"Failed to remove discipline '{discipline_name}'")
+        log.debug('discipline not removed', extra={
+            'discipline': discipline_name, 'disciplines': list(self.discipline_order)})
         return False
     
     def add_course(self, discipline_name, course_code):
         if discipline_name not in self.disciplines:
             return False
             
-        course_data = self.courses_df[self.courses_df['Course_code'] == course_code]
-        if course_data.empty:
+        course = self.catalog.get(course_code)
+        if course is None:
             return False
             
         # Check if course is already added to any discipline
-        if any(course_code in courses for courses in self.disciplines.values()):
+        if course_code in self.course_owner:
             return False
             
         # For ISCI discipline, only allow ISCI courses
-        if discipline_name == "ISCI":
-            isci_value = course_data.iloc[0]['isci_courses']
-            if pd.isna(isci_value) or isci_value <= 0:
-                return False
+        if discipline_name == "ISCI" and not course.isci_course:
+            return False
             
         self.disciplines[discipline_name].append(course_code)
+        self.totals[discipline_name].add(course)
+        self.course_owner[course_code] = discipline_name
+        self._record(('add_course', discipline_name, course_code), ('remove_course', discipline_name, course_code))
         return True
     
     def remove_course(self, discipline_name, course_code):
         if discipline_name in self.disciplines:
-            if course_code in self.disciplines[discipline_name]:
-                self.disciplines[discipline_name].remove(course_code)
+            if self.course_owner.get(course_code) == discipline_name:
+                courses = self.disciplines[discipline_name]
+                self._record(('remove_course', discipline_name, course_code),
+                             ('_insert_course', discipline_name, course_code, courses.index(course_code)))
+                courses.remove(course_code)
+                self.totals[discipline_name].add(self.catalog.index[course_code], sign=-1)
+                del self.course_owner[course_code]
                 return True
         return False
 
     def is_400_level(self, course_code):
-        course_data = self.courses_df[self.courses_df['Course_code'] == course_code].iloc[0]
-        course_num = str(course_data['Course'])
-        base_num = ''.join(filter(str.isdigit, course_num.split()[0]))
-        return int(base_num) >= 400
+        return self.catalog.index[course_code].is_400_level
 
     def get_course_credits(self, course_code):
-        course_data = self.courses_df[self.courses_df['Course_code'] == course_code].iloc[0]
-        
-        # Get raw values from CSV
-        science_value = course_data['science_credits']
-        honorary_value = course_data['honorary_credits']
-        isci_value = course_data['isci_courses']
+        course = self.catalog.index[course_code]
         
         return {
-            'discipline_credit': float(course_data['discipline_credit']),
+            'discipline_credit': course.discipline_credit,
             # Only count as science credit if the science_credits column has a value
-            'science_credit': not pd.isna(science_value) and science_value > 0,
-            'science_value': float(science_value) if not pd.isna(science_value) else 0,
-            'isci_course': not pd.isna(isci_value) and isci_value > 0,
-            'isci_value': float(isci_value) if not pd.isna(isci_value) else 0,
-            'honorary_credit': not pd.isna(honorary_value) and honorary_value > 0,
-            'honorary_value': float(honorary_value) if not pd.isna(honorary_value) else 0
+            'science_credit': course.science_credit,
+            'science_value': course.science_value,
+            'isci_course': course.isci_course,
+            'isci_value': course.isci_value,
+            'honorary_credit': course.honorary_credit,
+            'honorary_value': course.honorary_value
         }
 
-    def validate_proposal(self):
-        # Set requirements based on stream
-        if self.stream == "honours":
-            discipline_min_credits = 12
-            isci_min_credits = 13
-            total_credits_required = 42
-            science_credits_required = 49
-            max_honorary_credits = 7
-            non_isci_science_required = 27
-            total_400_level_required = 18
-            require_isci_449 = True
-        else:  # regular stream
-            discipline_min_credits = 9
-            isci_min_credits = 7
-            total_credits_required = 33
-            science_credits_required = 40
-            max_honorary_credits = 10
-            non_isci_science_required = 27
-            total_400_level_required = 12
-            require_isci_449 = False
-        
-        validation_results = {
-            'success': True,
-            'messages': [],
-            'total_credits': 0,
-            'science_credits': 0,
-            'isci_credits': 0,
-            'honorary_credits': 0,
-            'total_400_level_credits': 0,
-            'disciplines_400_level': {},
-            'non_isci_science_credits': 0,
-            'non_isci_honorary_credits': 0,
-            'stream': self.stream,
-            'requirements': {
-                'discipline_count': { 'required': '2-3', 'actual': 0, 'met': False },
-                'isci_credits': { 'required': isci_min_credits, 'actual': 0, 'met': False },
-                'total_credits': { 'required': total_credits_required, 'actual': 0, 'met': False },
-                'science_credits': { 'required': science_credits_required, 'actual': 0, 'met': False },
-                'non_isci_science_credits': { 'required': non_isci_science_required, 'actual': 0, 'met': False },
-                'honorary_credits': { 'required': f'≤ {max_honorary_credits}', 'actual': 0, 'met': True },
-                'total_400_level': { 'required': total_400_level_required, 'actual': 0, 'met': False },
-                'disciplines_requirements': {}
-            }
-        }
-
-        # --- Initial Validation Checks ---
-        isci_courses = self.disciplines.get("ISCI", [])
-        has_isci_449 = "ISCI 449" in isci_courses
-
-        non_isci_disciplines = [d for d in self.disciplines.keys() if d != "ISCI"]
-        validation_results['requirements']['discipline_count']['actual'] = len(non_isci_disciplines)
-        validation_results['requirements']['discipline_count']['met'] = 2 <= len(non_isci_disciplines) <= 3
-        if not validation_results['requirements']['discipline_count']['met']:
-            validation_results['success'] = False
-            validation_results['messages'].append("Must have 2-3 disciplines (excluding ISCI)")
-
-        if require_isci_449 and not has_isci_449:
-            validation_results['success'] = False
-            validation_results['messages'].append("Honours stream requires ISCI 449 course")
+    def credit_aggregates(self):
+        """The totals build_validation_results checks, in its argument order"""
+        max_honorary_credits = get_plan(self.stream).max_honorary_credits
+        has_isci_449 = self.course_owner.get("ISCI 449") == "ISCI"
 
-        # --- Credit Calculation Loop ---
+        # --- Credit Totals (maintained incrementally by add/remove) ---
         total_credits = 0
         pure_non_isci_science_credits = 0
         isci_science_credits = 0
         honorary_courses = []
         total_400_level_credits = 0
+        discipline_credits = []
 
         for discipline in self.discipline_order:
             if discipline not in self.disciplines: continue
-            courses = self.disciplines[discipline]
-            
-            discipline_credits = 0
-            discipline_400_level_credits = 0
-            
-            for course in courses:
-                credits = self.get_course_credits(course)
-                discipline_credits += credits['discipline_credit']
-                
-                if self.is_400_level(course):
-                    if discipline != "ISCI":
-                        total_400_level_credits += credits['discipline_credit']
-                    discipline_400_level_credits += credits['discipline_credit']
-
-                if discipline == "ISCI":
-                    if credits['isci_course']:
-                        isci_science_credits += credits['isci_value'] or credits['discipline_credit']
-                else: # Non-ISCI disciplines
-                    # This logic prevents double-counting. A course is either honorary or pure science.
-                    if credits['honorary_credit']:
-                        honorary_courses.append({
-                            'course': course,
-                            'credit': credits['honorary_value']
-                        })
-                    elif credits['science_credit']:
-                        pure_non_isci_science_credits += credits['science_value']
+            totals = self.totals[discipline]
+            discipline_credits.append((discipline, totals.credit_total(), totals.level_400_total()))
             
             if discipline != "ISCI":
-                total_credits += discipline_credits
+                total_credits += totals.credit_total()
+                if totals.level_400_count:
+                    total_400_level_credits += totals.level_400_total()
+                if totals.science_count:
+                    pure_non_isci_science_credits += totals.science_credits
+                honorary_courses.extend(totals.honorary_courses)
+            elif totals.isci_count:
+                isci_science_credits += totals.isci_credits
 
-            # --- Per-Discipline Requirement Checks ---
-            is_isci_discipline = discipline == "ISCI"
-            min_credits_for_discipline = isci_min_credits if is_isci_discipline else discipline_min_credits
-            
-            discipline_met = discipline_credits >= min_credits_for_discipline
-            if is_isci_discipline and require_isci_449:
-                discipline_met = discipline_met and has_isci_449
-
-            has_400_level_met = True
-            if not is_isci_discipline:
-                has_400_level_met = discipline_400_level_credits > 0
-                if not has_400_level_met:
-                    validation_results['success'] = False
-                    validation_results['messages'].append(f"Discipline {discipline} must have at least one 400-level course")
-
-            validation_results['requirements']['disciplines_requirements'][discipline] = {
-                'course_count': { 'required': min_credits_for_discipline, 'actual': discipline_credits, 'met': discipline_met },
-                'has_400_level': { 'required': True, 'actual': discipline_400_level_credits > 0, 'met': has_400_level_met }
-            }
-            if not discipline_met:
-                validation_results['success'] = False
-                if is_isci_discipline and require_isci_449 and not has_isci_449:
-                    validation_results['messages'].append(f"Discipline ISCI requires ISCI 449 for honours stream")
-                else:
-                    validation_results['messages'].append(f"Discipline {discipline} needs at least {min_credits_for_discipline} credits")
-
-        # --- Final Overall Requirement Checks ---
+        # Honorary credits count towards science in order, up to the cap
         honorary_credits_used = 0
         honorary_credits_available = 0
-        for course_info in honorary_courses:
-            honorary_credits_available += course_info['credit']
-            if honorary_credits_used + course_info['credit'] <= max_honorary_credits:
-                honorary_credits_used += course_info['credit']
-        
-        total_science = isci_science_credits + pure_non_isci_science_credits + honorary_credits_used
-        non_isci_science_total = pure_non_isci_science_credits + honorary_credits_used
-        
-        # Update actual values in validation_results
-        validation_results['total_credits'] = total_credits
-        validation_results['science_credits'] = total_science
-        validation_results['isci_credits'] = isci_science_credits
-        validation_results['non_isci_science_credits'] = non_isci_science_total
-        validation_results['honorary_credits'] = honorary_credits_available
-        validation_results['non_isci_honorary_credits'] = honorary_credits_available
-        validation_results['total_400_level_credits'] = total_400_level_credits
-
-        # Update requirement status ('met' boolean)
-        reqs = validation_results['requirements']
-        reqs['isci_credits']['actual'] = isci_science_credits
-        reqs['isci_credits']['met'] = reqs['isci_credits']['actual'] >= reqs['isci_credits']['required']
-
-        reqs['total_credits']['actual'] = total_credits
-        reqs['total_credits']['met'] = reqs['total_credits']['actual'] >= reqs['total_credits']['required']
-
-        reqs['science_credits']['actual'] = total_science
-        reqs['science_credits']['met'] = reqs['science_credits']['actual'] >= reqs['science_credits']['required']
-
-        reqs['non_isci_science_credits']['actual'] = non_isci_science_total
-        reqs['non_isci_science_credits']['met'] = reqs['non_isci_science_credits']['actual'] >= reqs['non_isci_science_credits']['required']
-
-        reqs['honorary_credits']['actual'] = honorary_credits_available
-        reqs['honorary_credits']['met'] = reqs['honorary_credits']['actual'] <= max_honorary_credits
-
-        reqs['total_400_level']['actual'] = total_400_level_credits
-        reqs['total_400_level']['met'] = reqs['total_400_level']['actual'] >= reqs['total_400_level']['required']
-
-        # Update overall success and messages based on new 'met' status
-        if not reqs['total_credits']['met']:
-            validation_results['success'] = False
-            validation_results['messages'].append(f"Need at least {total_credits_required} total credits in non-ISCI disciplines")
-        if not reqs['science_credits']['met']:
-            validation_results['success'] = False
-            validation_results['messages'].append(f"Need at least {science_credits_required} total science credits")
-        if not reqs['non_isci_science_credits']['met']:
-            validation_results['success'] = False
-            validation_results['messages'].append(f"Need at least {non_isci_science_required} science credits from non-ISCI disciplines")
-        if not reqs['honorary_credits']['met']:
-            validation_results['success'] = False
-            validation_results['messages'].append(f"Cannot have more than {max_honorary_credits} honorary credits")
-        if not reqs['total_400_level']['met']:
-            validation_results['success'] = False
-            validation_results['messages'].append(f"Need at least {total_400_level_required} credits from 400-level non-ISCI courses")
-
-        return validation_results
+        for _, credit in honorary_courses:
+            honorary_credits_available += credit
+            if honorary_credits_used + credit <= max_honorary_credits:
+                honorary_credits_used += credit
+
+        return (discipline_credits, has_isci_449, total_credits,
+                isci_science_credits, pure_non_isci_science_credits,
+                honorary_credits_used, honorary_credits_available, total_400_level_credits)
+
+    def validate_proposal(self):
+        return build_validation_results(self.stream, *self.credit_aggregates())
 
     def search_courses(self, query, limit=10):
         if not query or len(query) < 2:
             return []
             
-        query = query.lower()
         try:
-            # Convert columns to string and handle NaN values
-            self.courses_df['Course'] = self.courses_df['Course'].fillna('').astype(str)
-            self.courses_df['Course_code'] = self.courses_df['Course_code'].fillna('').astype(str)
-            self.courses_df['Title'] = self.courses_df['Title'].fillna('').astype(str)
-            
-            # Search using string methods
-            mask = (
-                self.courses_df['Course_code'].str.lower().str.contains(query, na=False) | 
-                self.courses_df['Title'].str.lower().str.contains(query, na=False)
-            )
-            matched_courses = self.courses_df[mask]
-            
-            # Sort by exact matches first
-            matched_courses = matched_courses.sort_values(
-                by='Course_code',
-                key=lambda x: x.str.lower().str.startswith(query).astype(int),
-                ascending=False
-            )
-            
-            # Return limited results
-            results = matched_courses.head(limit).to_dict('records')
-            return [{'code': str(r['Course_code']), 'name': str(r['Title'])} for r in results]
-        except Exception as e:
-            print(f"Error in search_courses: {str(e)}")
+            # Code-prefix matches first, then other matches in catalog order
+            results = self.catalog.search(query, limit)
+            return [{'code': r.code, 'name': r.title} for r in results]
+        except Exception:
+            log.exception('course search failed', extra={'query': query})
             return []
 
 
+# Where proposals live between requests: memory (default, single process),
+# sqlite:///sessions.db (shared by the workers on one machine) or
+# redis://host:port/db (shared across machines)
+session_store = create_session_store(
+    os.environ.get('SESSION_STORE', 'memory'),
+    dumps=DegreeProposal.to_session_json,
+    loads=DegreeProposal.from_json,
+    ttl=SESSION_TIMEOUT,
+    max_sessions=MAX_SESSIONS
+)
+
 
 @app.route('/reset', methods=['POST'])
 def reset_proposal():
@@ -394,12 +652,16 @@ def reset_proposal():
         session_id, proposal = get_user_proposal(session_id)
         
         proposal.reset_proposal()
+        save_user_proposal(session_id, proposal)
         return jsonify({
             'success': True,
             'message': 'Proposal reset successfully',
             'session_id': session_id
         })
+    except (RateLimited, SessionConflict):
+        raise  # answered by their errorhandlers
     except Exception as e:
+        log.exception('request failed')
         return jsonify({
             'success': False,
             'message': str(e)
@@ -413,13 +675,16 @@ def add_discipline():
     
     data = request.json
     success = proposal.add_discipline(data['discipline_name'])
+    if success:
+        save_user_proposal(session_id, proposal)
     
     # Return updated validation after adding discipline
     if success:
-        results = proposal.validate_proposal()
+        with timed('validate'):
+            results = proposal.validate_proposal()
         return jsonify({
             'success': success, 
-            'validation': results,
+            **validation_fields(proposal, results),
             'session_id': session_id
         })
     return jsonify({
@@ -431,17 +696,18 @@ def add_discipline():
 def remove_discipline(discipline_name):
     # Get session_id from query parameter
     session_id = request.args.get('session')
-    print(f"DELETE discipline request: '{discipline_name}', session: {session_id}")
-    
     session_id, proposal = get_user_proposal(session_id)
     success = proposal.remove_discipline(discipline_name)
+    if success:
+        save_user_proposal(session_id, proposal)
     
     # Return updated validation after removing discipline
     if success:
-        results = proposal.validate_proposal()
+        with timed('validate'):
+            results = proposal.validate_proposal()
         return jsonify({
             'success': success, 
-            'validation': results,
+            **validation_fields(proposal, results),
             'session_id': session_id
         })
     
@@ -451,6 +717,13 @@ def remove_discipline(discipline_name):
         'session_id': session_id
     })
 
+def course_rejection_message(proposal, discipline_name, course_code):
+    """Explain why add_course refused a course, if there's a specific reason"""
+    course = proposal.catalog.get(course_code)
+    if course is not None and discipline_name == "ISCI" and not course.isci_course:
+        return 'Only ISCI courses can be added to the ISCI discipline'
+    return None
+
 @app.route('/courses', methods=['POST'])
 def add_course():
     try:
@@ -460,46 +733,86 @@ def add_course():
         
         data = request.json
         success = proposal.add_course(data['discipline_name'], data['course_code'])
+        if success:
+            save_user_proposal(session_id, proposal)
         
+        course = proposal.catalog.get(data['course_code'])
         if success:
-            course_data = proposal.courses_df[
-                proposal.courses_df['Course_code'] == data['course_code']
-            ].iloc[0]
-            
-            results = proposal.validate_proposal()
+            with timed('validate'):
+                results = proposal.validate_proposal()
             return jsonify({
                 'success': success,
-                'validation': results,
+                **validation_fields(proposal, results),
                 'course': {
                     'code': data['course_code'],
-                    'title': course_data['Title']
+                    'title': course.title
                 },
                 'session_id': session_id
             })
         else:
             # Check why the course couldn't be added
-            course_data = proposal.courses_df[
-                proposal.courses_df['Course_code'] == data['course_code']
-            ]
-            if not course_data.empty:
-                isci_course = not pd.isna(course_data.iloc[0]['isci_courses']) and course_data.iloc[0]['isci_courses'] > 0
-                if data['discipline_name'] == "ISCI" and not isci_course:
-                    return jsonify({
-                        'success': False,
-                        'message': 'Only ISCI courses can be added to the ISCI discipline',
-                        'session_id': session_id
-                    })
+            message = course_rejection_message(proposal, data['discipline_name'], data['course_code'])
+            if message:
+                return jsonify({
+                    'success': False,
+                    'message': message,
+                    'session_id': session_id
+                })
                         
             return jsonify({
                 'success': False,
                 'session_id': session_id
             })
+    except (RateLimited, SessionConflict):
+        raise  # answered by their errorhandlers
     except Exception as e:
+        log.exception('request failed')
         return jsonify({
             'success': False,
             'message': str(e)
         }), 500
 
+# Most candidate courses scored by one /courses/impact request
+MAX_IMPACT_CANDIDATES = 500
+
+@app.route('/courses/impact', methods=['POST'])
+def course_impact():
+    """What adding each candidate course to a discipline would change
+
+    Nothing is added or saved; every candidate is scored against the
+    current proposal on its own.
+    """
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+
+    data = request.json or {}
+    discipline_name = data.get('discipline_name')
+    course_codes = data.get('course_codes')
+    if (not isinstance(course_codes, list) or len(course_codes) > MAX_IMPACT_CANDIDATES
+            or not all(isinstance(code, str) for code in course_codes)):
+        return jsonify({
+            'success': False,
+            'message': f"'course_codes' must be a list of at most {MAX_IMPACT_CANDIDATES} course codes",
+            'session_id': session_id
+        }), 400
+    if discipline_name not in proposal.disciplines:
+        return jsonify({
+            'success': False,
+            'message': f"Discipline {discipline_name} is not in the proposal",
+            'session_id': session_id
+        }), 400
+
+    # Imported on first use so workers that never score candidates don't load NumPy
+    from impact import score_candidates
+    with timed('impact'):
+        impacts = score_candidates(proposal, discipline_name, course_codes, get_plan(proposal.stream))
+    return jsonify({
+        'success': True,
+        'discipline_name': discipline_name,
+        'impacts': impacts,
+        'session_id': session_id
+    })
+
 @app.route('/courses', methods=['DELETE'])
 def remove_course():
     # Get session_id from query parameter
@@ -508,13 +821,16 @@ def remove_course():
     
     data = request.json
     success = proposal.remove_course(data['discipline_name'], data['course_code'])
+    if success:
+        save_user_proposal(session_id, proposal)
     
     # Return updated validation after removing course
     if success:
-        results = proposal.validate_proposal()
+        with timed('validate'):
+            results = proposal.validate_proposal()
         return jsonify({
             'success': success, 
-            'validation': results,
+            **validation_fields(proposal, results),
             'session_id': session_id
         })
     return jsonify({
@@ -528,32 +844,93 @@ def validate_proposal():
     session_id = request.args.get('session')
     session_id, proposal = get_user_proposal(session_id)
     
-    results = proposal.validate_proposal()
+    with timed('validate'):
+        results = proposal.validate_proposal()
     return jsonify({
         **results,
+        'validation_version': remember_validation(proposal, results),
         'session_id': session_id
     })
 
 @app.route('/search-courses', methods=['GET'])
 def search_courses():
+    # Results don't depend on the session, so don't create or touch one
+    session_id = request.args.get('session')
     try:
-        # Get session_id from query parameter
-        session_id = request.args.get('session')
-        session_id, proposal = get_user_proposal(session_id)
-        
         query = request.args.get('query', '')
-        results = proposal.search_courses(query)
-        return jsonify({
-            'results': results,
-            'session_id': session_id
-        })
-    except Exception as e:
-        print(f"Search endpoint error: {str(e)}")
+        catalog = get_catalog()
+        with timed('search'):
+            if session_id and request.args.get('typeahead') == '1':
+                # Typeahead input boxes opt in: a query superseded while it
+                # waited gets the newest one's results. Plain lookups never do
+                searched, results = search_coalescer.run(
+                    session_id, query, lambda q: search_cache.get_or_search(catalog, q))
+            else:
+                searched, results = query, search_cache.get_or_search(catalog, query)
+        # The cached results are already serialized; only wrap them
+        with timed('serialize'):
+            body = '{"results":%s,"session_id":%s}' % (results, json.dumps(session_id))
+            if searched != query:
+                body = body[:-1] + ',"superseded_by":%s}' % json.dumps(searched)
+        return app.response_class(body, mimetype='application/json')
+    except Exception:
+        log.exception('search endpoint failed', extra={'query': request.args.get('query', '')})
         return jsonify({
             'results': [],
-            'session_id': session_id if 'session_id' in locals() else None
+            'session_id': session_id
         })
 
+@app.route('/catalog', methods=['GET'])
+def catalog_export():
+    """The whole catalog for client-side search, cacheable per catalog version
+
+    ?version= pins a catalog version: when it's the current one the response
+    may be cached forever. Gzipped and identity bodies get different ETags.
+    """
+    catalog = get_catalog()
+    with timed('serialize'):
+        export = catalog.export()
+    gzipped = bool(request.accept_encodings['gzip'])
+    etag = export.etag + '-gzip' if gzipped else export.etag
+    if request.args.get('version') == catalog.version:
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = f'public, max-age={CATALOG_MAX_AGE}'
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(export.gzipped if gzipped else export.body, mimetype='application/json')
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/suggest-courses', methods=['GET'])
+def suggest_courses():
+    """Fewest courses that would complete the proposal, and its validation with them"""
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+
+    with timed('validate'):
+        validation = proposal.validate_proposal()
+    with timed('suggest'):
+        suggestion = suggest_completion(proposal, get_plan(proposal.stream), validation)
+
+    # Nothing is saved; the suggestions are applied to a copy to show the outcome
+    completed = proposal.copy()
+    for course in suggestion['courses']:
+        completed.add_course(course['discipline'], course['code'])
+    with timed('validate'):
+        validation = completed.validate_proposal()
+    return jsonify({
+        **suggestion,
+        'validation': validation,
+        'session_id': session_id
+    })
+
 @app.route('/proposal-state', methods=['GET'])
 def get_proposal_state():
     # Get session_id from query parameter
@@ -575,15 +952,18 @@ def set_stream():
     session_id, proposal = get_user_proposal(session_id)
     
     data = request.json
-    stream = data.get('stream', 'regular')
+    stream = data.get('stream', DEFAULT_STREAM)
     
     success = proposal.set_stream(stream)
+    if success:
+        save_user_proposal(session_id, proposal)
     
     if success:
-        results = proposal.validate_proposal()
+        with timed('validate'):
+            results = proposal.validate_proposal()
         return jsonify({
             'success': True, 
-            'validation': results,
+            **validation_fields(proposal, results),
             'session_id': session_id
         })
     
@@ -593,6 +973,279 @@ def set_stream():
         'session_id': session_id
     })
 
+# Largest number of operations accepted by one /proposal/batch request
+MAX_BATCH_OPERATIONS = 500
+
+def apply_batch_operation(proposal, operation):
+    """Apply one /proposal/batch operation, return its per-operation result"""
+    op = operation.get('op')
+    if op == 'add_discipline':
+        success = proposal.add_discipline(operation['discipline_name'])
+    elif op == 'remove_discipline':
+        success = proposal.remove_discipline(operation['discipline_name'])
+    elif op == 'add_course':
+        success = proposal.add_course(operation['discipline_name'], operation['course_code'])
+        if not success:
+            message = course_rejection_message(proposal, operation['discipline_name'], operation['course_code'])
+            if message:
+                return {'op': op, 'success': False, 'message': message}
+    elif op == 'remove_course':
+        success = proposal.remove_course(operation['discipline_name'], operation['course_code'])
+    elif op == 'set_stream':
+        success = proposal.set_stream(operation.get('stream', DEFAULT_STREAM))
+    elif op == 'reset':
+        proposal.reset_proposal()
+        success = True
+    else:
+        return {'op': op, 'success': False, 'message': f"Unknown operation '{op}'"}
+    return {'op': op, 'success': success}
+
+@app.route('/proposal/batch', methods=['POST'])
+def batch_update():
+    """Apply an ordered list of operations and validate once at the end
+
+    Operations run against a copy of the proposal. With atomic (the
+    default) any failed operation discards the whole batch; otherwise the
+    successful operations are kept. Either way the session is written once.
+    """
+    # Get session_id from query parameter
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+
+    data = request.json or {}
+    operations = data.get('operations')
+    atomic = data.get('atomic', True)
+    if not isinstance(operations, list) or len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({
+            'success': False,
+            'message': f"'operations' must be a list of at most {MAX_BATCH_OPERATIONS} operations",
+            'session_id': session_id
+        }), 400
+
+    working = proposal.copy()
+    results = []
+    for operation in operations:
+        try:
+            results.append(apply_batch_operation(working, operation))
+        except (KeyError, TypeError, AttributeError) as e:
+            results.append({
+                'op': operation.get('op') if isinstance(operation, dict) else None,
+                'success': False,
+                'message': f"Malformed operation: {str(e)}"
+            })
+
+    all_succeeded = all(result['success'] for result in results)
+    applied = all_succeeded or not atomic
+    if applied:
+        proposal = working
+        save_user_proposal(session_id, proposal)
+
+    with timed('validate'):
+        validation = proposal.validate_proposal()
+    return jsonify({
+        'success': all_succeeded,
+        'applied': applied,
+        'results': results,
+        **validation_fields(proposal, validation),
+        'session_id': session_id
+    })
+
+def proposal_state(proposal):
+    return {
+        'disciplines': proposal.disciplines,
+        'discipline_order': proposal.discipline_order,
+        'stream': proposal.stream
+    }
+
+def version_response(session_id, proposal, success):
+    """State and validation after moving between versions"""
+    return jsonify({
+        'success': success,
+        'version': proposal.history.current,
+        **proposal_state(proposal),
+        **validation_fields(proposal, cached_validation(proposal)),
+        'session_id': session_id
+    })
+
+@app.route('/proposal/undo', methods=['POST'])
+def undo_change():
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+    success = proposal.undo()
+    if success:
+        save_user_proposal(session_id, proposal)
+    return version_response(session_id, proposal, success)
+
+@app.route('/proposal/redo', methods=['POST'])
+def redo_change():
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+    success = proposal.redo()
+    if success:
+        save_user_proposal(session_id, proposal)
+    return version_response(session_id, proposal, success)
+
+@app.route('/proposal/checkout', methods=['POST'])
+def checkout_version():
+    """Jump to any kept version, by id or snapshot name
+
+    Changes made from there start a new branch; the old one stays reachable.
+    """
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+    data = request.json or {}
+    success = proposal.checkout(data.get('version'))
+    if success:
+        save_user_proposal(session_id, proposal)
+    return version_response(session_id, proposal, success)
+
+@app.route('/proposal/snapshots', methods=['POST'])
+def create_snapshot():
+    """Name the current version so it can be checked out or compared later"""
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+    name = (request.json or {}).get('name')
+    if not isinstance(name, str) or not name:
+        return jsonify({
+            'success': False,
+            'message': "'name' must be a non-empty string",
+            'session_id': session_id
+        }), 400
+    version = proposal.history.snapshot(name)
+    save_user_proposal(session_id, proposal)
+    return jsonify({
+        'success': True,
+        'name': name,
+        'version': version,
+        'session_id': session_id
+    })
+
+@app.route('/proposal/history', methods=['GET'])
+def get_proposal_history():
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+    return jsonify({
+        'current': proposal.history.current,
+        'versions': proposal.history.summary(),
+        'session_id': session_id
+    })
+
+def state_differences(a, b):
+    """What changes going from proposal a to proposal b"""
+    differences = {
+        'disciplines_added': [d for d in b.discipline_order if d not in a.disciplines],
+        'disciplines_removed': [d for d in a.discipline_order if d not in b.disciplines],
+        'courses_added': {},
+        'courses_removed': {}
+    }
+    if a.stream != b.stream:
+        differences['stream'] = {'a': a.stream, 'b': b.stream}
+    for key, old, new in (('courses_added', a, b), ('courses_removed', b, a)):
+        for discipline in new.discipline_order:
+            courses = [c for c in new.disciplines[discipline] if old.course_owner.get(c) != discipline]
+            if courses:
+                differences[key][discipline] = courses
+    return differences
+
+@app.route('/proposal/compare', methods=['GET'])
+def compare_versions():
+    """Two versions side by side: ?a= and ?b= (default: the current one)"""
+    session_id = request.args.get('session')
+    session_id, proposal = get_user_proposal(session_id)
+
+    sides = []
+    for ref in (request.args.get('a'), request.args.get('b', proposal.history.current)):
+        version = proposal.copy()
+        if not version.checkout(ref):
+            return jsonify({
+                'success': False,
+                'message': f"Unknown version: {ref}",
+                'session_id': session_id
+            }), 404
+        sides.append(version)
+
+    results = [cached_validation(version) for version in sides]
+    requirements = {
+        name: {'a': results[0]['requirements'][name]['met'], 'b': results[1]['requirements'][name]['met']}
+        for name in results[0]['requirements']
+        if name != 'disciplines_requirements' and name in results[1]['requirements']
+        and results[0]['requirements'][name]['met'] != results[1]['requirements'][name]['met']
+    }
+    return jsonify({
+        'success': True,
+        'a': {'version': sides[0].history.current, **proposal_state(sides[0]), 'validation': results[0]},
+        'b': {'version': sides[1].history.current, **proposal_state(sides[1]), 'validation': results[1]},
+        'differences': {**state_differences(*sides), 'requirements': requirements},
+        'session_id': session_id
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text metrics"""
+    store_stats = session_store.stats()
+    cache_stats = search_cache.stats()
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    history_stats = validation_history.stats()
+    gauges = {
+        'active_sessions': ('Sessions currently held by the session store', store_stats['sessions']),
+        'search_cache_entries': ('Entries in the search result cache', cache_stats['size']),
+        'search_cache_hit_ratio': ('Share of searches served from the cache',
+                                   cache_stats['hits'] / lookups if lookups else 0),
+        'catalog_courses': ('Courses in the current catalog', len(get_catalog().index)),
+    }
+    counters = {
+        'session_expirations_total': ('Sessions removed after being idle', store_stats.get('expirations', 0)),
+        'session_evictions_total': ('Sessions evicted by the session cap', store_stats.get('evictions', 0)),
+        'session_conflicts_total': ('Saves refused because another worker changed the session first', store_stats.get('conflicts', 0)),
+        'search_cache_hits_total': ('Searches served from the cache', cache_stats['hits']),
+        'search_cache_misses_total': ('Searches that ran against the index', cache_stats['misses']),
+        'catalog_reloads_total': ('Catalog versions swapped in without a restart', reload_stats['reloads']),
+        'catalog_reload_failures_total': ('Catalog reloads abandoned because loading failed',
+                                          reload_stats['failures']),
+        'validation_deltas_total': ('Mutation responses sent as a patch', history_stats['hits']),
+        'validation_delta_misses_total': ('Delta requests against a version no longer held',
+                                          history_stats['misses']),
+        'admission_ip_rejections_total': ('Requests refused by the per-IP rate limit', admission_stats['ip_rejections']),
+        'admission_session_rejections_total': ('Requests refused by the per-session rate limit',
+                                               admission_stats['session_rejections']),
+        'admission_new_session_rejections_total': ('Session creations refused by the per-IP limit',
+                                                   admission_stats['new_session_rejections']),
+        'search_requests_coalesced_total': ('Searches replaced by a newer one from the same session while waiting',
+                                            admission_stats['searches_coalesced']),
+        'log_records_dropped_total': ('Log records dropped because the log queue was full', log_stats['dropped']),
+        'log_records_sampled_out_total': ('Log records skipped by level sampling', log_stats['sampled_out']),
+        'log_records_rate_limited_total': ('Warnings and errors held back by the rate limit',
+                                           log_stats['rate_limited']),
+    }
+    return app.response_class(render_metrics(gauges, counters), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/reload-catalog', methods=['POST'])
+def admin_reload_catalog():
+    """Reload courses.csv now instead of waiting for the next poll
+
+    Only reloads the worker that handles the request; the others pick the
+    change up on their next poll.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {ADMIN_TOKEN}'.encode('utf-8')):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    previous_version = get_catalog().version
+    catalog, status = reload_catalog(force=True)
+    return jsonify({
+        'success': status != 'failed',
+        'status': status,
+        'previous_version': previous_version,
+        'version': catalog.version,
+        'courses': len(catalog.index)
+    }), 500 if status == 'failed' else 200
+
+# Each worker imports this module itself (no --preload), so each gets a watcher
+if CATALOG_POLL_INTERVAL > 0:
+    start_catalog_watcher(CATALOG_POLL_INTERVAL)
+
 if __name__ == '__main__':
     app.run(debug=True)
 
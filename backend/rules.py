@@ -0,0 +1,180 @@
+# backend/rules.py
+"""Degree requirements compiled from degree_rules.json
+
+The rules file lists threshold checks, in the order their results are
+reported, and each stream's thresholds. Every stream is compiled once into
+a RequirementPlan holding just the checks it has thresholds for, with
+limits, displayed requirements and messages already resolved, so
+evaluating a proposal is one pass over a list of tuples.
+"""
+import json
+import os
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'degree_rules.json')
+
+# Values a check can compare; see RequirementPlan.evaluate
+METRICS = {
+    'discipline_count', 'isci_credits', 'total_credits', 'science_credits',
+    'non_isci_science_credits', 'honorary_credits', 'total_400_level_credits'
+}
+
+# Thresholds every stream needs for the per-discipline checks
+DISCIPLINE_THRESHOLDS = ('discipline_min_credits', 'isci_min_credits', 'require_isci_449')
+
+
+def _required_display(minimum, maximum):
+    """What a check reports as 'required', as the frontend has always shown it"""
+    if maximum is None:
+        return minimum
+    if minimum is None:
+        return f'≤ {maximum}'
+    return f'{minimum}-{maximum}'
+
+
+class RequirementPlan:
+    """One stream's requirements, ready to evaluate"""
+
+    def __init__(self, stream, thresholds, checks):
+        self.stream = stream
+        self.thresholds = thresholds
+        self.discipline_min_credits = thresholds['discipline_min_credits']
+        self.isci_min_credits = thresholds['isci_min_credits']
+        self.require_isci_449 = thresholds['require_isci_449']
+        self.max_honorary_credits = thresholds.get('max_honorary_credits', float('inf'))
+        self.isci_449_message = f"{stream.capitalize()} stream requires ISCI 449 course"
+        self.isci_449_discipline_message = f"Discipline ISCI requires ISCI 449 for {stream} stream"
+        # (requirement, metric, minimum, maximum, required, message, before_disciplines)
+        self.checks = []
+        for check in checks:
+            minimum_key = check.get('min')
+            maximum_key = check.get('max')
+            if any(key is not None and key not in thresholds for key in (minimum_key, maximum_key)):
+                continue
+            minimum = thresholds[minimum_key] if minimum_key is not None else None
+            maximum = thresholds[maximum_key] if maximum_key is not None else None
+            message = check.get('message')
+            self.checks.append((
+                check['requirement'], check['metric'], minimum, maximum,
+                _required_display(minimum, maximum),
+                message.format(**thresholds) if message is not None else None,
+                check.get('before_disciplines', False)
+            ))
+
+    def evaluate(self, discipline_credits, has_isci_449, total_credits,
+                 isci_science_credits, pure_non_isci_science_credits,
+                 honorary_credits_used, honorary_credits_available,
+                 total_400_level_credits):
+        """Validation results for aggregated credit totals
+
+        discipline_credits lists (discipline, credits, 400-level credits) in
+        discipline order.
+        """
+        total_science = isci_science_credits + pure_non_isci_science_credits + honorary_credits_used
+        non_isci_science_total = pure_non_isci_science_credits + honorary_credits_used
+        metrics = {
+            'discipline_count': sum(1 for d, _, _ in discipline_credits if d != "ISCI"),
+            'isci_credits': isci_science_credits,
+            'total_credits': total_credits,
+            'science_credits': total_science,
+            'non_isci_science_credits': non_isci_science_total,
+            'honorary_credits': honorary_credits_available,
+            'total_400_level_credits': total_400_level_credits,
+        }
+
+        success = True
+        messages = []
+        later_messages = []
+        requirements = {}
+        for requirement, metric, minimum, maximum, required, message, before_disciplines in self.checks:
+            actual = metrics[metric]
+            met = (minimum is None or actual >= minimum) and (maximum is None or actual <= maximum)
+            requirements[requirement] = {'required': required, 'actual': actual, 'met': met}
+            if not met and message is not None:
+                success = False
+                (messages if before_disciplines else later_messages).append(message)
+
+        missing_isci_449 = self.require_isci_449 and not has_isci_449
+        if missing_isci_449:
+            success = False
+            messages.append(self.isci_449_message)
+
+        # --- Per-discipline checks ---
+        disciplines_requirements = requirements['disciplines_requirements'] = {}
+        for discipline, credits, level_400_credits in discipline_credits:
+            is_isci_discipline = discipline == "ISCI"
+            min_credits_for_discipline = self.isci_min_credits if is_isci_discipline else self.discipline_min_credits
+
+            discipline_met = credits >= min_credits_for_discipline
+            if is_isci_discipline and missing_isci_449:
+                discipline_met = False
+
+            has_400_level_met = True
+            if not is_isci_discipline:
+                has_400_level_met = level_400_credits > 0
+                if not has_400_level_met:
+                    success = False
+                    messages.append(f"Discipline {discipline} must have at least one 400-level course")
+
+            disciplines_requirements[discipline] = {
+                'course_count': {'required': min_credits_for_discipline, 'actual': credits, 'met': discipline_met},
+                'has_400_level': {'required': True, 'actual': level_400_credits > 0, 'met': has_400_level_met}
+            }
+            if not discipline_met:
+                success = False
+                if is_isci_discipline and missing_isci_449:
+                    messages.append(self.isci_449_discipline_message)
+                else:
+                    messages.append(f"Discipline {discipline} needs at least {min_credits_for_discipline} credits")
+
+        messages.extend(later_messages)
+        return {
+            'success': success,
+            'messages': messages,
+            'total_credits': total_credits,
+            'science_credits': total_science,
+            'isci_credits': isci_science_credits,
+            'honorary_credits': honorary_credits_available,
+            'total_400_level_credits': total_400_level_credits,
+            'disciplines_400_level': {},
+            'non_isci_science_credits': non_isci_science_total,
+            'non_isci_honorary_credits': honorary_credits_available,
+            'stream': self.stream,
+            'requirements': requirements
+        }
+
+
+def load_plans(path=RULES_PATH):
+    """Compile every stream in a rules file, return (plans by stream, default stream)
+
+    Raises ValueError for a rules file that can't be evaluated.
+    """
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    checks = rules.get('checks', [])
+    for check in checks:
+        if check.get('metric') not in METRICS:
+            raise ValueError(f"Unknown metric in requirement check: {check.get('metric')}")
+        if 'requirement' not in check or (check.get('min') is None and check.get('max') is None):
+            raise ValueError(f"Requirement check needs a requirement and a min or max: {check}")
+        if check['requirement'] == 'disciplines_requirements':
+            raise ValueError("disciplines_requirements is reserved for the per-discipline checks")
+
+    plans = {}
+    for stream, thresholds in rules['streams'].items():
+        missing = [key for key in DISCIPLINE_THRESHOLDS if key not in thresholds]
+        if missing:
+            raise ValueError(f"Stream {stream} is missing thresholds: {', '.join(missing)}")
+        plans[stream] = RequirementPlan(stream, thresholds, checks)
+
+    default_stream = rules.get('default_stream')
+    if default_stream not in plans:
+        raise ValueError(f"Default stream {default_stream} is not defined")
+    return plans, default_stream
+
+
+PLANS, DEFAULT_STREAM = load_plans()
+
+
+def get_plan(stream):
+    """The plan for a stream; unknown streams get the default stream's"""
+    return PLANS.get(stream) or PLANS[DEFAULT_STREAM]
@@ -0,0 +1,407 @@
+# backend/session_store.py
+import socket
+import sqlite3
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class SessionConflict(Exception):
+    """The session changed in the store since this request loaded it"""
+
+
+class SessionStore:
+    """Where proposals live between requests
+
+    get() returns (proposal or None, version) for a session and counts as
+    activity; put() stores a new or modified proposal and returns its new
+    version. Persistent backends serialize proposals with the dumps/loads
+    callables they are given.
+
+    Stores shared between processes version every session: put() only
+    writes if the session is still at the version passed in (None for a
+    session that must not exist yet), and raises SessionConflict otherwise,
+    so a change made by another worker is never silently overwritten. The
+    memory store is only ever used by one process, whose session locks
+    already serialize each session; its versions are always None.
+    """
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def put(self, session_id, proposal, version=None):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def cleanup_inactive(self, timeout):
+        """Remove sessions idle for more than timeout seconds, return how many
+
+        Called on every request, so it must be cheap when there's nothing to do.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        return {'sessions': len(self)}
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class _SessionStripe:
+    """One lock-protected LRU of sessions
+
+    Sessions sit in an OrderedDict from least to most recently used, so
+    touching one is a move_to_end and expiring or evicting only ever looks
+    at the front: both amortised O(1).
+    """
+
+    def __init__(self, clock):
+        self.clock = clock  # orders activity across stripes
+        self.sessions = OrderedDict()  # session_id -> (proposal, last_activity, tick)
+        self.expirations = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return None
+            self.sessions[session_id] = (entry[0], time.time(), next(self.clock))
+            self.sessions.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id, proposal):
+        """Store a session, True if it is a new one"""
+        with self.lock:
+            new = session_id not in self.sessions
+            self.sessions[session_id] = (proposal, time.time(), next(self.clock))
+            self.sessions.move_to_end(session_id)
+            return new
+
+    def oldest_tick(self):
+        """Activity tick of the least recently used session, None if empty"""
+        with self.lock:
+            if not self.sessions:
+                return None
+            return next(iter(self.sessions.values()))[2]
+
+    def evict_oldest(self):
+        with self.lock:
+            if self.sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def cleanup_inactive(self, cutoff):
+        removed = 0
+        with self.lock:
+            while self.sessions:
+                session_id, (_, last_time, _) = next(iter(self.sessions.items()))
+                if last_time >= cutoff:
+                    break
+                del self.sessions[session_id]
+                removed += 1
+            self.expirations += removed
+        return removed
+
+
+class MemorySessionStore(SessionStore):
+    """Proposals kept as live objects in this process
+
+    Sessions are spread over independently locked stripes by hash, so
+    threads working on different sessions rarely contend. The store as a
+    whole holds at most max_sessions: adding one past that evicts the least
+    recently used session of all, found at the front of one of the stripes.
+    """
+
+    def __init__(self, max_sessions=10000, stripes=16):
+        self.max_sessions = max_sessions
+        clock = itertools.count()
+        self._stripes = [_SessionStripe(clock) for _ in range(stripes)]
+        # Held while evicting, so concurrent puts never evict twice for one session
+        self._evict_lock = threading.Lock()
+
+    def _stripe(self, session_id):
+        return self._stripes[hash(session_id) % len(self._stripes)]
+
+    def get(self, session_id):
+        return self._stripe(session_id).get(session_id), None
+
+    def put(self, session_id, proposal, version=None):
+        if self._stripe(session_id).put(session_id, proposal) and len(self) > self.max_sessions:
+            with self._evict_lock:
+                while len(self) > self.max_sessions:
+                    self._evict_oldest()
+
+    def _evict_oldest(self):
+        oldest = None
+        for stripe in self._stripes:
+            tick = stripe.oldest_tick()
+            if tick is not None and (oldest is None or tick < oldest[0]):
+                oldest = (tick, stripe)
+        oldest[1].evict_oldest()
+
+    def delete(self, session_id):
+        self._stripe(session_id).delete(session_id)
+
+    def cleanup_inactive(self, timeout):
+        cutoff = time.time() - timeout
+        return sum(stripe.cleanup_inactive(cutoff) for stripe in self._stripes)
+
+    def stats(self):
+        return {
+            'sessions': len(self),
+            'max_sessions': self.max_sessions,
+            'expirations': sum(stripe.expirations for stripe in self._stripes),
+            'evictions': sum(stripe.evictions for stripe in self._stripes),
+        }
+
+    def __len__(self):
+        return sum(len(stripe.sessions) for stripe in self._stripes)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Proposals in a SQLite file shared by every worker on the machine
+
+    Runs in WAL mode so readers never block the writer. Each thread gets its
+    own connection. Writes are compare-and-set on the version column.
+    """
+
+    # Don't rewrite last_activity on every read, only when it's this stale
+    TOUCH_INTERVAL = 60
+    # Run the (indexed) expiry DELETE at most this often per process
+    CLEANUP_INTERVAL = 60
+
+    def __init__(self, path, dumps, loads):
+        self.path = path
+        self.dumps = dumps
+        self.loads = loads
+        self.expirations = 0
+        self.conflicts = 0
+        self._next_cleanup = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            ' session_id TEXT PRIMARY KEY,'
+            ' data TEXT NOT NULL,'
+            ' last_activity REAL NOT NULL,'
+            ' version INTEGER NOT NULL DEFAULT 1)'
+        )
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(sessions)')]
+        if 'version' not in columns:
+            # A file from before sessions were versioned
+            conn.execute('ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions (last_activity)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT data, last_activity, version FROM sessions WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        current_time = time.time()
+        if current_time - row[1] > self.TOUCH_INTERVAL:
+            conn.execute(
+                'UPDATE sessions SET last_activity = ? WHERE session_id = ?', (current_time, session_id)
+            )
+        return self.loads(row[0]), row[2]
+
+    def put(self, session_id, proposal, version=None):
+        conn = self._connect()
+        if version is None:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO sessions (session_id, data, last_activity, version) VALUES (?, ?, ?, 1)',
+                (session_id, self.dumps(proposal), time.time())
+            )
+        else:
+            cursor = conn.execute(
+                'UPDATE sessions SET data = ?, last_activity = ?, version = version + 1'
+                ' WHERE session_id = ? AND version = ?',
+                (self.dumps(proposal), time.time(), session_id, version)
+            )
+        if cursor.rowcount != 1:
+            self.conflicts += 1
+            raise SessionConflict(session_id)
+        return 1 if version is None else version + 1
+
+    def delete(self, session_id):
+        self._connect().execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def cleanup_inactive(self, timeout):
+        current_time = time.time()
+        if current_time < self._next_cleanup:
+            return 0
+        self._next_cleanup = current_time + self.CLEANUP_INTERVAL
+        cursor = self._connect().execute(
+            'DELETE FROM sessions WHERE last_activity < ?', (current_time - timeout,)
+        )
+        self.expirations += cursor.rowcount
+        return cursor.rowcount
+
+    def stats(self):
+        return {'sessions': len(self), 'expirations': self.expirations, 'conflicts': self.conflicts}
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class RedisSessionStore(SessionStore):
+    """Proposals in anything that speaks the Redis protocol (RESP)
+
+    Talks RESP directly over a socket, so no client library is needed. Keys
+    carry a TTL, which the server uses to expire idle sessions itself.
+    Values are the version, a newline and the serialized proposal; writes
+    are compare-and-set with WATCH/MULTI.
+    """
+
+    KEY_PREFIX = 'proposal:'
+
+    def __init__(self, host, port, db, dumps, loads, ttl):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.dumps = dumps
+        self.loads = loads
+        self.ttl = int(ttl)
+        self.conflicts = 0
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=5)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+            if self.db:
+                self._command('SELECT', self.db)
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connect()
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        try:
+            sock.sendall(b''.join(parts))
+            return self._read_reply(reader)
+        except OSError:
+            # Drop the broken connection so the next call reconnects
+            self._local.conn = None
+            raise
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by session store')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            raise RuntimeError(f"Session store error: {payload.decode('utf-8')}")
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)[:-2]
+            return data.decode('utf-8')
+        if kind == b'*':
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(count)]
+        raise RuntimeError(f"Unexpected reply from session store: {line!r}")
+
+    @staticmethod
+    def _split(value):
+        """(version, serialized proposal) of a stored value"""
+        if value.startswith('{'):
+            # Stored before sessions were versioned
+            return 0, value
+        version, _, data = value.partition('\n')
+        return int(version), data
+
+    def get(self, session_id):
+        key = self.KEY_PREFIX + session_id
+        value = self._command('GET', key)
+        if value is None:
+            return None, None
+        self._command('EXPIRE', key, self.ttl)
+        version, data = self._split(value)
+        return self.loads(data), version
+
+    def put(self, session_id, proposal, version=None):
+        key = self.KEY_PREFIX + session_id
+        data = self.dumps(proposal)
+        if version is None:
+            if self._command('SET', key, f'1\n{data}', 'NX', 'EX', self.ttl) is None:
+                self.conflicts += 1
+                raise SessionConflict(session_id)
+            return 1
+        # EXEC fails if the key changes between WATCH and EXEC
+        self._command('WATCH', key)
+        value = self._command('GET', key)
+        if value is None or self._split(value)[0] != version:
+            self._command('UNWATCH')
+            self.conflicts += 1
+            raise SessionConflict(session_id)
+        self._command('MULTI')
+        self._command('SET', key, f'{version + 1}\n{data}', 'EX', self.ttl)
+        if self._command('EXEC') is None:
+            self.conflicts += 1
+            raise SessionConflict(session_id)
+        return version + 1
+
+    def delete(self, session_id):
+        self._command('DEL', self.KEY_PREFIX + session_id)
+
+    def cleanup_inactive(self, timeout):
+        # Keys expire on their own
+        return 0
+
+    def stats(self):
+        return {'sessions': len(self), 'conflicts': self.conflicts}
+
+    def __len__(self):
+        return self._command('DBSIZE')
+
+
+def create_session_store(url, dumps, loads, ttl, max_sessions=10000):
+    """Build a store from a URL: memory, sqlite:///path/to.db or redis://host:port/db"""
+    if not url or url == 'memory':
+        return MemorySessionStore(max_sessions)
+
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        path = parsed.path
+        if url.startswith('sqlite:///') and not url.startswith('sqlite:////'):
+            # sqlite:///sessions.db is relative, sqlite:////tmp/sessions.db absolute
+            path = path[1:]
+        return SQLiteSessionStore(path, dumps, loads)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisSessionStore(parsed.hostname or 'localhost', parsed.port or 6379, db, dumps, loads, ttl)
+
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
@@ -0,0 +1,387 @@
+# backend/suggest.py
+"""Suggest the fewest catalog courses that complete a proposal
+
+Courses are interchangeable for validation when they add the same credits,
+400-level status, science and honorary value, so each subject's courses
+are grouped into a handful of such classes once per catalog version. The
+unmet requirements then become covering constraints over how many courses
+to take from each (discipline, class) pair, plus a packing constraint for
+the honorary cap. A depth-first branch and bound, seeded with a greedy
+solution, finds the smallest count that satisfies them. If it runs out of
+search nodes first it settles for the best suggestion found so far and
+reports it as not proven optimal.
+"""
+import math
+from collections import namedtuple
+
+# Search nodes before settling for the best suggestion found so far
+MAX_NODES = 2000
+EPSILON = 1e-9
+# Group of the needs only non-ISCI disciplines can meet
+NON_ISCI = object()
+
+# Courses from one class that would all count the same way; codes in catalog order
+CourseClass = namedtuple('CourseClass', [
+    'credit',          # discipline credit
+    'is_400_level',
+    'science_value',   # towards non-ISCI science: science or honorary value
+    'honorary_value',  # uses up honorary cap room
+    'isci_value',      # towards ISCI credits, for ISCI courses
+    'is_isci_449',
+    'codes',
+])
+
+
+class SubjectAggregates:
+    """Course classes per subject (and for the ISCI discipline) for one catalog"""
+
+    def __init__(self, catalog):
+        self.version = catalog.version
+        self.row = {code: i for i, code in enumerate(catalog.index)}
+        by_subject = {}
+        isci = {}
+        for record in catalog.index.values():
+            credit = record.discipline_credit
+            if credit != credit:
+                continue  # NaN credits would leave the discipline total NaN
+            if record.honorary_credit:
+                science, honorary = record.honorary_value, record.honorary_value
+            else:
+                science, honorary = (record.science_value if record.science_credit else 0), 0
+            key = (credit, record.is_400_level, science, honorary)
+            by_subject.setdefault(record.code.split()[0], {}).setdefault(key, []).append(record.code)
+            if record.isci_course:
+                key = (credit, record.isci_value or credit, record.code == "ISCI 449")
+                isci.setdefault(key, []).append(record.code)
+
+        self.subjects = {
+            subject: [CourseClass(credit, is_400, science, honorary, 0, False, tuple(codes))
+                      for (credit, is_400, science, honorary), codes in classes.items()]
+            for subject, classes in by_subject.items()
+        }
+        self.isci = [CourseClass(credit, False, 0, 0, isci_value, is_449, tuple(codes))
+                     for (credit, isci_value, is_449), codes in isci.items()]
+
+    def classes_for(self, discipline):
+        return self.isci if discipline == "ISCI" else self.subjects.get(discipline, [])
+
+
+_aggregates = None
+
+
+def get_subject_aggregates(catalog):
+    global _aggregates
+    if _aggregates is None or _aggregates.version != catalog.version:
+        _aggregates = SubjectAggregates(catalog)
+    return _aggregates
+
+
+def _shortfall(required, actual):
+    shortfall = required - actual
+    return shortfall if shortfall != shortfall or shortfall > 0 else 0
+
+
+# What one course adds to each metric a threshold check can need more of,
+# and the group of disciplines that can add it; see build_constraints
+METRIC_GAINS = {
+    'total_credits': (NON_ISCI, lambda d, c: c.credit if d != "ISCI" else 0),
+    'total_400_level_credits': (NON_ISCI, lambda d, c: c.credit if d != "ISCI" and c.is_400_level else 0),
+    'isci_credits': ("ISCI", lambda d, c: c.isci_value if d == "ISCI" else 0),
+    'non_isci_science_credits': (NON_ISCI, lambda d, c: c.science_value if d != "ISCI" else 0),
+    'science_credits': (None, lambda d, c: c.isci_value if d == "ISCI" else c.science_value),
+}
+
+
+def build_constraints(proposal, plan, validation):
+    """Turn the unmet requirements of a validated proposal into constraints
+
+    Returns (items, needs, groups, room, unresolved): items are
+    (discipline, CourseClass, available codes, gains), gains[r] being what
+    one course adds towards needs[r]; groups[r] is the discipline a need is
+    confined to, NON_ISCI for needs any non-ISCI discipline can meet and
+    None for total science, which every discipline counts towards.
+
+    Needs come from the plan's own checks, so a stream without some
+    threshold simply has no need for it. Adding courses only ever raises a
+    metric, so a maximum other than the honorary cap can only be reported
+    when it's already exceeded.
+    """
+    aggregates = get_subject_aggregates(proposal.catalog)
+    reqs = validation['requirements']
+    unresolved = []
+    # Checks no course can help with (the discipline count)
+    for requirement, metric, _, _, _, message, _ in plan.checks:
+        if metric not in METRIC_GAINS and metric != 'honorary_credits' and not reqs[requirement]['met']:
+            unresolved.append(message or f"Requirement {requirement} is not met")
+
+    needs, groups, rules = [], [], []
+
+    def need(amount, group, rule):
+        if amount != amount:  # NaN
+            label = 'the proposal' if group is None else 'non-ISCI disciplines' if group is NON_ISCI else group
+            unresolved.append(f"Credits for {label} can't be totalled")
+        elif amount > EPSILON:
+            needs.append(amount)
+            groups.append(group)
+            rules.append(rule)
+
+    # --- Per-discipline minimums and 400-level courses ---
+    for discipline, status in reqs['disciplines_requirements'].items():
+        count = status['course_count']
+        need(_shortfall(count['required'], count['actual']), discipline,
+             lambda d, c, discipline=discipline: c.credit if d == discipline else 0)
+        if discipline == "ISCI":
+            if plan.require_isci_449 and proposal.course_owner.get("ISCI 449") != "ISCI":
+                need(1, discipline, lambda d, c: 1 if c.is_isci_449 else 0)
+        elif not status['has_400_level']['met']:
+            need(1, discipline, lambda d, c, discipline=discipline: 1 if d == discipline and c.is_400_level else 0)
+
+    # --- Proposal-wide totals ---
+    room = plan.max_honorary_credits - validation['honorary_credits']
+    room_message = f"Cannot have more than {plan.max_honorary_credits} honorary credits"
+    for requirement, metric, minimum, maximum, _, message, _ in plan.checks:
+        actual = reqs[requirement]['actual']
+        message = message or f"Requirement {requirement} is not met"
+        if metric == 'honorary_credits':
+            if maximum is not None and maximum - actual < room:
+                room, room_message = maximum - actual, message
+            if minimum is not None and actual < minimum:
+                unresolved.append(message)
+        elif metric in METRIC_GAINS:
+            if maximum is not None and actual > maximum:
+                unresolved.append(message)
+            if minimum is not None:
+                group, rule = METRIC_GAINS[metric]
+                need(_shortfall(minimum, actual), group, rule)
+    if room < 0:
+        unresolved.append(room_message)
+        room = 0
+
+    items = []
+    taken = proposal.course_owner
+    for discipline in proposal.discipline_order:
+        for course_class in aggregates.classes_for(discipline):
+            codes = [code for code in course_class.codes if code not in taken]
+            gains = [rule(discipline, course_class) for rule in rules]
+            if codes and any(gain > 0 for gain in gains):
+                items.append((discipline, course_class, codes, gains))
+    return items, needs, groups, room, unresolved
+
+
+def _courses_needed(supply, amount):
+    """Fewest courses from supply, [(gain, count)...] by falling gain, adding up to amount"""
+    taken = 0
+    for gain, count in supply:
+        if amount <= gain * count + EPSILON:
+            return taken + max(0, math.ceil(amount / gain - EPSILON))
+        amount -= gain * count
+        taken += count
+    return math.inf
+
+
+def _greedy(available, gains, costs, needs, room):
+    """A good first solution: repeatedly take the course covering the most"""
+    counts = [0] * len(available)
+    remaining = list(needs)
+    while any(amount > EPSILON for amount in remaining):
+        best_item, best_cover = None, 0
+        for i, item_gains in enumerate(gains):
+            if counts[i] == available[i] or costs[i] > room + EPSILON:
+                continue
+            cover = sum(min(gain, amount) / need
+                        for gain, amount, need in zip(item_gains, remaining, needs) if amount > EPSILON)
+            if cover > best_cover + EPSILON:
+                best_item, best_cover = i, cover
+        if best_item is None:
+            return None
+        counts[best_item] += 1
+        room -= costs[best_item]
+        remaining = [amount - gain for amount, gain in zip(remaining, gains[best_item])]
+    # Drop any course the others turn out to cover for
+    for i in range(len(counts)):
+        while counts[i] and all(amount + gain <= EPSILON or gain <= 0
+                                for amount, gain in zip(remaining, gains[i])):
+            counts[i] -= 1
+            remaining = [amount + gain for amount, gain in zip(remaining, gains[i])]
+    return counts
+
+
+def solve(items, needs, groups, room, max_nodes=MAX_NODES):
+    """Fewest courses per item meeting every need without exceeding room
+
+    Returns (counts or None, optimal). Needs that no combination of items
+    can reach must be dropped beforehand (see unreachable_needs).
+    """
+    # Most broadly useful classes first, so the first solution is a good one
+    def usefulness(item):
+        return sum(min(gain, n) / n for gain, n in zip(item[3], needs))
+    order = sorted(range(len(items)), key=lambda i: -usefulness(items[i]))
+    available = [len(items[i][2]) for i in order]
+    gains = [items[i][3] for i in order]
+    costs = [items[i][1].honorary_value for i in order]
+    is_isci = [items[i][0] == "ISCI" for i in order]
+    n_items, n_needs = len(order), len(needs)
+
+    # What items i onwards can still supply towards each need, best first,
+    # from ISCI and from non-ISCI disciplines separately, and in total
+    def supplies(select):
+        row = [[] for _ in range(n_needs)]
+        table = [row]
+        for i in reversed(range(n_items)):
+            if select(i):
+                row = [sorted(supply + [(gain, available[i])], reverse=True) if gain > 0 else supply
+                       for supply, gain in zip(row, gains[i])]
+            table.append(row)
+        table.reverse()
+        return table
+
+    def supply_totals(table):
+        return [[sum(gain * count for gain, count in supply) for supply in row] for row in table]
+    any_supply = supplies(lambda i: True)
+    isci_supply = supplies(lambda i: is_isci[i])
+    non_isci_supply = supplies(lambda i: not is_isci[i])
+    isci_total = supply_totals(isci_supply)
+    non_isci_total = supply_totals(non_isci_supply)
+
+    # Taking a course from a class that another class matches or beats on
+    # every need (at no more honorary cost) is only worth it once that
+    # class is used up
+    dominators = [
+        [i for i in range(j)
+         if costs[i] <= costs[j] and all(a >= b for a, b in zip(gains[i], gains[j]))]
+        for j in range(n_items)
+    ]
+    disciplines = {g for g in groups if g is not None and g is not NON_ISCI and g != "ISCI"}
+    grouped = [[r for r in range(n_needs) if groups[r] == name] for name in disciplines]
+    isci_needs = [r for r in range(n_needs) if groups[r] == "ISCI"]
+    non_isci_needs = [r for r in range(n_needs) if groups[r] is NON_ISCI]
+    shared_needs = [r for r in range(n_needs) if groups[r] is None]
+
+    def lower_bound(i, remaining):
+        if all(amount <= EPSILON for amount in remaining):
+            return 0
+        per_need = [_courses_needed(any_supply[i][r], remaining[r]) if remaining[r] > EPSILON else 0
+                    for r in range(n_needs)]
+        # ISCI courses never count for non-ISCI needs and vice versa, and
+        # needs confined to different disciplines are met by disjoint courses
+        isci = max((per_need[r] for r in isci_needs), default=0)
+        non_isci = max(sum(max(per_need[r] for r in group) for group in grouped),
+                       max((per_need[r] for r in non_isci_needs), default=0))
+        # A shared need leaves each side whatever the other can't supply
+        for r in shared_needs:
+            if remaining[r] > EPSILON:
+                isci = max(isci, _courses_needed(isci_supply[i][r], remaining[r] - non_isci_total[i][r]))
+                non_isci = max(non_isci, _courses_needed(non_isci_supply[i][r], remaining[r] - isci_total[i][r]))
+        return max(max(per_need), isci + non_isci)
+
+    root_bound = lower_bound(0, needs)
+    best = {'count': math.inf, 'counts': None}
+    chosen = [0] * n_items
+    nodes = [0]
+
+    def search(i, remaining, room_left, count):
+        nodes[0] += 1
+        bound = lower_bound(i, remaining)
+        if count + bound >= best['count']:
+            return
+        if bound == 0:
+            best['count'] = count
+            best['counts'] = list(chosen)
+            return
+        if i == n_items or nodes[0] > max_nodes:
+            return
+        limit = available[i]
+        if any(chosen[d] < available[d] for d in dominators[i]):
+            limit = 0
+        if costs[i] > 0 and room_left < math.inf:
+            limit = min(limit, int((room_left + EPSILON) // costs[i]))
+        useful = max((math.ceil(remaining[r] / gains[i][r] - EPSILON)
+                      for r in range(n_needs) if remaining[r] > EPSILON and gains[i][r] > 0), default=0)
+        for k in range(min(limit, useful), -1, -1):
+            chosen[i] = k
+            search(i + 1, [need - k * gain for need, gain in zip(remaining, gains[i])],
+                   room_left - k * costs[i], count + k)
+            if best['count'] == root_bound or nodes[0] > max_nodes:
+                break
+        chosen[i] = 0
+
+    if root_bound < math.inf:
+        counts = _greedy(available, gains, costs, needs, room)
+        if counts is not None:
+            best['count'] = sum(counts)
+            best['counts'] = counts
+        search(0, list(needs), room, 0)
+    if best['counts'] is None:
+        return None, nodes[0] <= max_nodes
+    counts = [0] * len(items)
+    for position, i in enumerate(order):
+        counts[i] = best['counts'][position]
+    return counts, nodes[0] <= max_nodes or best['count'] == root_bound
+
+
+def unreachable_needs(items, needs, room):
+    """Indexes of needs that even every available course couldn't meet"""
+    unreachable = []
+    for r, amount in enumerate(needs):
+        total = 0
+        honorary = []
+        for _, course_class, codes, gains in items:
+            if gains[r] <= 0:
+                continue
+            if course_class.honorary_value > 0:
+                honorary.extend([course_class.honorary_value] * len(codes))
+            else:
+                total += gains[r] * len(codes)
+        # Honorary courses only fit up to the cap; smallest first fits the most
+        room_left = room
+        for value in sorted(honorary):
+            if value <= room_left + EPSILON:
+                total += value
+                room_left -= value
+        if total + EPSILON < amount:
+            unreachable.append(r)
+    return unreachable
+
+
+def suggest_completion(proposal, plan, validation, max_nodes=MAX_NODES):
+    """Fewest courses to add so the proposal meets every requirement it can
+
+    proposal supplies catalog, discipline_order and course_owner;
+    plan and validation are its stream's RequirementPlan and its
+    validate_proposal() results. Courses only go to the discipline of
+    their subject, and to ISCI only if they are ISCI courses.
+    """
+    items, needs, groups, room, unresolved = build_constraints(proposal, plan, validation)
+    aggregates = get_subject_aggregates(proposal.catalog)
+
+    unreachable = set(unreachable_needs(items, needs, room))
+    if unreachable:
+        unresolved.append("Not enough courses in the catalog to meet every requirement "
+                          "with the current disciplines")
+        keep = [r for r in range(len(needs)) if r not in unreachable]
+        needs = [needs[r] for r in keep]
+        groups = [groups[r] for r in keep]
+        items = [(d, c, codes, [gains[r] for r in keep]) for d, c, codes, gains in items]
+        items = [item for item in items if any(gain > 0 for gain in item[3])]
+
+    counts, optimal = solve(items, needs, groups, room, max_nodes)
+    if counts is None:
+        if needs:
+            unresolved.append("No combination of courses meets the remaining requirements "
+                              "within the honorary credit cap")
+        counts = [0] * len(items)
+
+    index = proposal.catalog.index
+    courses = []
+    for (discipline, _, codes, _), count in zip(items, counts):
+        for code in codes[:count]:
+            courses.append({'discipline': discipline, 'code': code, 'name': index[code].title})
+    # Present them in discipline order, then catalog order
+    position = {d: i for i, d in enumerate(proposal.discipline_order)}
+    courses.sort(key=lambda course: (position[course['discipline']], aggregates.row[course['code']]))
+    return {
+        'courses': courses,
+        'complete': not unresolved,
+        'optimal': optimal,
+        'unresolved': unresolved,
+    }
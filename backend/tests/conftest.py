@@ -0,0 +1,15 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+# The app's modules import each other by name from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# No catalog watcher thread under test
+os.environ.setdefault('CATALOG_POLL_INTERVAL', '0')
+# Only problems in the test output
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# Every test client request comes from one address, and the concurrency
+# tests hammer single sessions
+os.environ.setdefault('ADMISSION_SESSION_RATE', '0')
+os.environ.setdefault('ADMISSION_NEW_SESSION_RATE', '0')
+os.environ.setdefault('ADMISSION_UNLIMITED', '1')
@@ -0,0 +1,56 @@
+# backend/tests/test_catalog.py
+"""Loading the catalog from its memory-mapped snapshot"""
+import shutil
+
+import pytest
+
+from catalog import CATALOG_PATH, CourseCatalog, CourseRecord, read_csv_records
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / 'courses.csv'
+    shutil.copy(CATALOG_PATH, path)
+    return path
+
+
+def same_value(a, b):
+    # Types too: missing credits resolve to the integer 0
+    return type(a) is type(b) and (a == b or (a != a and b != b))
+
+
+def test_snapshot_courses_match_the_csv(csv_path):
+    catalog = CourseCatalog(str(csv_path))
+    assert catalog.source == 'snapshot'
+    assert (csv_path.parent / 'courses.snapshot').exists()
+    records = read_csv_records(csv_path.read_bytes())
+
+    assert list(catalog.index) == [record.code for record in records]
+    for record in records:
+        course = catalog.get(record.code)
+        for field in CourseRecord._fields:
+            assert same_value(getattr(course, field), getattr(record, field)), (record.code, field)
+
+
+def test_stale_snapshot_is_recompiled(csv_path):
+    first = CourseCatalog(str(csv_path))
+    lines = csv_path.read_text(encoding='utf-8').splitlines()
+    csv_path.write_text('\n'.join(line for line in lines if ',MATH 300,' not in line), encoding='utf-8')
+
+    second = CourseCatalog(str(csv_path))
+    assert second.source == 'snapshot'
+    assert second.version != first.version
+    assert second.get('MATH 300') is None
+    # The first catalog keeps reading the file it mapped
+    assert first.get('MATH 300').title == 'Introduction to Complex Variables'
+
+
+def test_unusable_snapshot_falls_back_to_the_csv(csv_path):
+    (csv_path.parent / 'courses.snapshot').write_bytes(b'not a snapshot')
+    catalog = CourseCatalog(str(csv_path), snapshot_path=str(csv_path.parent / 'missing' / 'courses.snapshot'))
+    assert catalog.source == 'csv'
+    assert catalog.get('MATH 300').discipline_credit == 3.0
+
+    # A corrupt file is replaced by a freshly compiled one
+    catalog = CourseCatalog(str(csv_path))
+    assert catalog.source == 'snapshot'
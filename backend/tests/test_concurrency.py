@@ -0,0 +1,144 @@
+# backend/tests/test_concurrency.py
+"""Concurrent mutations of the same and of different sessions
+
+A bounded version of `benchmark.py stress`, run against each session store
+the app can share between threads.
+"""
+import json
+import random
+import threading
+
+import pytest
+
+import parser
+from catalog import get_catalog
+from parser import DegreeProposal
+from session_store import SessionConflict, create_session_store
+
+THREADS = 8
+OPERATIONS = 40
+SUBJECTS = ['MATH', 'BIOL', 'CHEM']
+
+
+def make_store(kind, tmp_path):
+    url = 'memory' if kind == 'memory' else f'sqlite:///{tmp_path}/sessions.db'
+    return create_session_store(
+        url,
+        dumps=DegreeProposal.to_session_json,
+        loads=DegreeProposal.from_json,
+        ttl=parser.SESSION_TIMEOUT,
+        max_sessions=parser.MAX_SESSIONS
+    )
+
+
+def proposal_problems(proposal):
+    """Ways a proposal's bookkeeping disagrees with its course lists"""
+    problems = []
+    seen = {}
+    for discipline in proposal.discipline_order:
+        for code in proposal.disciplines[discipline]:
+            if code in seen:
+                problems.append(f'{code} is in both {seen[code]} and {discipline}')
+            seen[code] = discipline
+    if seen != proposal.course_owner:
+        problems.append('course_owner does not match the course lists')
+    if json.dumps(proposal.validate_proposal()) != json.dumps(proposal.copy().validate_proposal()):
+        problems.append('incremental totals differ from a full recompute')
+    return problems
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_concurrent_mutations(kind, tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'session_store', make_store(kind, tmp_path))
+    codes = {subject: [code for code in get_catalog().index if code.startswith(subject + ' ')][:15]
+             for subject in SUBJECTS}
+
+    client = parser.app.test_client()
+    shared = client.post('/reset').get_json()['session_id']
+    for subject in SUBJECTS:
+        client.post(f'/disciplines?session={shared}', json={'discipline_name': subject})
+
+    lock = threading.Lock()
+    net_adds = {}
+    statuses = {}
+    private_sessions = []
+
+    def worker(n):
+        rng = random.Random(n)
+        client = parser.app.test_client()
+        private = client.post('/reset').get_json()['session_id']
+        with lock:
+            private_sessions.append(private)
+        for subject in SUBJECTS:
+            client.post(f'/disciplines?session={private}', json={'discipline_name': subject})
+        for _ in range(OPERATIONS):
+            session_id = shared if rng.random() < 0.5 else private
+            subject = rng.choice(SUBJECTS)
+            code = rng.choice(codes[subject])
+            body = {'discipline_name': subject, 'course_code': code}
+            roll = rng.random()
+            if roll < 0.5:
+                response = client.post(f'/courses?session={session_id}', json=body)
+                delta = 1
+            elif roll < 0.9:
+                response = client.delete(f'/courses?session={session_id}', json=body)
+                delta = -1
+            else:
+                stream = rng.choice(['regular', 'honours'])
+                response = client.post(f'/set-stream?session={session_id}', json={'stream': stream})
+                delta = 0
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if session_id == shared and delta and response.get_json().get('success'):
+                    net_adds[code] = net_adds.get(code, 0) + delta
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == {200: THREADS * OPERATIONS}
+    with parser.app.test_request_context():
+        _, proposal = parser.get_user_proposal(shared)
+        present = set(proposal.course_owner)
+        for code, net in net_adds.items():
+            assert net in (0, 1) and (net == 1) == (code in present), code
+        for session_id in [shared] + private_sessions:
+            _, proposal = parser.get_user_proposal(session_id)
+            assert proposal_problems(proposal) == [], session_id
+
+
+def test_sqlite_workers_never_lose_updates(tmp_path):
+    """Two stores on one file stand in for two worker processes"""
+    stores = [make_store('sqlite', tmp_path) for _ in range(2)]
+    proposal = DegreeProposal()
+    for subject in SUBJECTS:
+        proposal.add_discipline(subject)
+    stores[0].put('shared', proposal)
+    added = []
+
+    def worker(n):
+        store = stores[n % 2]
+        subject = SUBJECTS[n % len(SUBJECTS)]
+        codes = [code for code in get_catalog().index if code.startswith(subject + ' ')]
+        for code in codes[n // len(SUBJECTS)::THREADS][:4]:
+            while True:
+                proposal, version = store.get('shared')
+                proposal.add_course(subject, code)
+                try:
+                    store.put('shared', proposal, version)
+                except SessionConflict:
+                    continue
+                added.append(code)
+                break
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    proposal, _ = stores[0].get('shared')
+    assert sorted(proposal.course_owner) == sorted(added)
+    assert len(added) == THREADS * 4
@@ -0,0 +1,152 @@
+# backend/tests/test_history.py
+"""Version history of proposals, and as kept by the persistent session stores"""
+import json
+import random
+
+import pytest
+
+import catalog as catalog_module
+import parser
+from catalog import CATALOG_PATH, CourseCatalog, get_catalog
+from parser import DegreeProposal
+from session_store import create_session_store
+
+SESSIONS = 300
+STEPS = 60
+# Small enough that pruning happens many times in every session
+MAX_VERSIONS = 8
+
+
+@pytest.fixture
+def reloaded_catalog(tmp_path):
+    """A catalog version without MATH 300, as if courses.csv had been edited"""
+    with open(CATALOG_PATH, encoding='utf-8') as f:
+        lines = [line for line in f if ',MATH 300,' not in line]
+    path = tmp_path / 'courses.csv'
+    path.write_text(''.join(lines), encoding='utf-8')
+    return CourseCatalog(str(path))
+
+
+@pytest.fixture
+def sqlite_app(tmp_path, monkeypatch):
+    """The app with sessions in SQLite, which round-trips them through JSON"""
+    store = create_session_store(
+        f'sqlite:///{tmp_path}/sessions.db',
+        dumps=DegreeProposal.to_session_json,
+        loads=DegreeProposal.from_json,
+        ttl=parser.SESSION_TIMEOUT
+    )
+    monkeypatch.setattr(parser, 'session_store', store)
+    return parser.app.test_client()
+
+
+def test_session_history_survives_the_same_catalog():
+    proposal = DegreeProposal()
+    proposal.add_discipline('MATH')
+    proposal.add_course('MATH', 'MATH 300')
+
+    restored = DegreeProposal.from_json(proposal.to_session_json())
+    assert restored.undo()
+    assert restored.disciplines['MATH'] == []
+
+
+def test_session_history_starts_afresh_on_another_catalog(reloaded_catalog):
+    proposal = DegreeProposal()
+    proposal.add_discipline('MATH')
+    proposal.add_course('MATH', 'MATH 300')
+    proposal.remove_course('MATH', 'MATH 300')
+
+    restored = DegreeProposal.from_json(proposal.to_session_json(), reloaded_catalog)
+    assert not restored.undo()
+    assert restored.to_json() == proposal.to_json()
+
+
+def test_undo_after_a_catalog_reload(sqlite_app, reloaded_catalog, monkeypatch):
+    session_id = sqlite_app.post('/reset').get_json()['session_id']
+    sqlite_app.post(f'/disciplines?session={session_id}', json={'discipline_name': 'MATH'})
+    added = sqlite_app.post(f'/courses?session={session_id}',
+                            json={'discipline_name': 'MATH', 'course_code': 'MATH 300'})
+    assert added.get_json()['success']
+    sqlite_app.delete(f'/courses?session={session_id}',
+                      json={'discipline_name': 'MATH', 'course_code': 'MATH 300'})
+
+    assert get_catalog() is not reloaded_catalog
+    monkeypatch.setattr(catalog_module, '_catalog', reloaded_catalog)
+    response = sqlite_app.post(f'/proposal/undo?session={session_id}')
+    assert response.status_code == 200
+    assert not response.get_json()['success']
+    assert response.get_json()['disciplines'] == {'ISCI': [], 'MATH': []}
+
+
+def history_problems(history):
+    """Ways the version tree is inconsistent"""
+    problems = []
+    versions = history.versions
+    if len(versions) > history.max_versions:
+        problems.append(f'{len(versions)} versions kept')
+    if history.current not in versions or history.root not in versions:
+        problems.append('current or root version not kept')
+    for version in versions.values():
+        if version.id == history.root:
+            if version.parent is not None:
+                problems.append('root has a parent')
+        elif version.parent not in versions:
+            problems.append(f'{version.id} has lost its parent')
+        children = sum(1 for v in versions.values() if v.parent == version.id and v.id != history.root)
+        if children != version.children:
+            problems.append(f'{version.id} counts {version.children} children, has {children}')
+        if version.redo is not None and versions.get(version.redo, version).parent != version.id:
+            problems.append(f'{version.id} redoes to a version that is not its child')
+    if any(version_id not in versions for version_id in history.snapshots.values()):
+        problems.append('snapshot of a version no longer kept')
+    return problems
+
+
+def test_history_fuzz(monkeypatch):
+    """Every version reached again must be in the state it was recorded in"""
+    monkeypatch.setattr(parser, 'MAX_PROPOSAL_VERSIONS', MAX_VERSIONS)
+    codes = list(get_catalog().index)
+    pruned = 0
+    for seed in range(SESSIONS):
+        rng = random.Random(seed)
+        proposal = DegreeProposal()
+        states = {proposal.history.current: proposal.to_json()}
+        for step in range(STEPS):
+            roll = rng.random()
+            if roll < 0.35:
+                proposal.add_course(rng.choice(proposal.discipline_order), rng.choice(codes))
+            elif roll < 0.45:
+                discipline = rng.choice(proposal.discipline_order)
+                if proposal.disciplines[discipline]:
+                    proposal.remove_course(discipline, rng.choice(proposal.disciplines[discipline]))
+            elif roll < 0.52:
+                proposal.add_discipline(rng.choice(['MATH', 'BIOL', 'CHEM', 'PHYS']))
+            elif roll < 0.57:
+                proposal.remove_discipline(rng.choice(proposal.discipline_order))
+            elif roll < 0.61:
+                proposal.set_stream(rng.choice(['regular', 'honours']))
+            elif roll < 0.63:
+                proposal.reset_proposal()
+            elif roll < 0.75:
+                proposal.undo()
+            elif roll < 0.82:
+                proposal.redo()
+            elif roll < 0.9:
+                ref = rng.choice(list(proposal.history.versions) + list(proposal.history.snapshots) + [-1])
+                kept = proposal.history.resolve(ref) is not None
+                assert proposal.checkout(ref) == kept
+            elif roll < 0.95:
+                proposal.history.snapshot(f'snap{step}')
+            else:
+                proposal = DegreeProposal.from_json(proposal.to_session_json())
+
+            current = proposal.history.current
+            if current in states:
+                assert proposal.to_json() == states[current], (seed, step)
+            else:
+                states[current] = proposal.to_json()
+            assert history_problems(proposal.history) == [], (seed, step)
+            fresh = DegreeProposal.from_json(proposal.to_json())
+            assert json.dumps(proposal.validate_proposal()) == json.dumps(fresh.validate_proposal()), (seed, step)
+        pruned += len(states) - len(proposal.history.versions)
+    assert pruned > SESSIONS * 5
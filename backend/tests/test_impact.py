@@ -0,0 +1,81 @@
+# backend/tests/test_impact.py
+"""score_candidates against actually adding each candidate and validating"""
+import random
+
+import pytest
+
+from catalog import get_catalog
+from impact import score_candidates
+from parser import DegreeProposal
+from rules import get_plan
+
+PROPOSALS = 150
+CANDIDATES = 40
+
+
+def same(a, b):
+    """Equal, counting NaN as equal to NaN and to the None impact reports for it"""
+    return a == b or (b != b and (a is None or a != a))
+
+
+@pytest.fixture(scope='module')
+def course_pool():
+    records = list(get_catalog().index.values())
+    special = [r.code for r in records
+               if r.discipline_credit != r.discipline_credit or r.honorary_credit or r.isci_course or r.is_400_level]
+    return [r.code for r in records], special
+
+
+def random_proposal(rng, codes, special):
+    proposal = DegreeProposal()
+    proposal.set_stream(rng.choice(['regular', 'honours']))
+    subjects = sorted({code.split()[0] for code in special})
+    for subject in rng.sample(subjects, rng.randint(1, 4)):
+        proposal.add_discipline(subject)
+    for _ in range(rng.randint(0, 40)):
+        discipline = rng.choice(proposal.discipline_order)
+        proposal.add_course(discipline, rng.choice(special if rng.random() < 0.6 else codes))
+    return proposal
+
+
+def requirement_items(validation, discipline):
+    """(name, requirement) for every requirement an impact can report on"""
+    requirements = validation['requirements']
+    items = [(name, r) for name, r in requirements.items() if name != 'disciplines_requirements']
+    own = requirements['disciplines_requirements'][discipline]
+    return items + [('course_count', own['course_count']), ('has_400_level', own['has_400_level'])]
+
+
+def test_matches_add_and_validate(course_pool):
+    codes, special = course_pool
+    compared = 0
+    for seed in range(PROPOSALS):
+        rng = random.Random(seed)
+        proposal = random_proposal(rng, codes, special)
+        discipline = rng.choice(proposal.discipline_order)
+        candidates = (rng.sample(codes, CANDIDATES) + rng.sample(special, 10)
+                      + list(proposal.course_owner)[:3] + ['ISCI 449', 'NOPE 100'])
+        impacts = score_candidates(proposal, discipline, candidates, get_plan(proposal.stream))
+        before = proposal.validate_proposal()
+
+        for code, impact in zip(candidates, impacts):
+            after_add = proposal.copy()
+            assert after_add.add_course(discipline, code) == impact['allowed'], (seed, code)
+            if not impact['allowed']:
+                continue
+            compared += 1
+            after = after_add.validate_proposal()
+            assert impact['success'] == after['success'], (seed, code)
+
+            met, unmet, changes = [], [], {}
+            before_items = dict(requirement_items(before, discipline))
+            for name, requirement in requirement_items(after, discipline):
+                previous = before_items[name]
+                if requirement['met'] != previous['met']:
+                    (met if requirement['met'] else unmet).append(name)
+                if name != 'has_400_level' and not same(requirement['actual'], previous['actual']):
+                    changes[name] = requirement['actual'] - previous['actual']
+            assert (impact['met'], impact['unmet']) == (met, unmet), (seed, code)
+            assert impact['changes'].keys() == changes.keys(), (seed, code)
+            assert all(same(impact['changes'][name], change) for name, change in changes.items()), (seed, code)
+    assert compared > PROPOSALS * CANDIDATES // 2
@@ -0,0 +1,271 @@
+# backend/tests/test_incremental_validation.py
+"""validate_proposal against the original full recompute
+
+reference_validation is the validate_proposal loop as it was before totals
+were maintained incrementally, frozen here (reading CourseRecords instead
+of the pandas frame, which resolve NaNs the same way). Random sequences of
+edits must leave validate_proposal giving exactly its output, compared as
+JSON so NaN credits and int-vs-float zeros count.
+"""
+import json
+import random
+
+import pytest
+
+from catalog import get_catalog
+from parser import DegreeProposal
+
+SEQUENCES = 3000
+STEPS = 25
+
+
+def reference_validation(stream, disciplines, discipline_order, catalog):
+    if stream == "honours":
+        discipline_min_credits = 12
+        isci_min_credits = 13
+        total_credits_required = 42
+        science_credits_required = 49
+        max_honorary_credits = 7
+        non_isci_science_required = 27
+        total_400_level_required = 18
+        require_isci_449 = True
+    else:  # regular stream
+        discipline_min_credits = 9
+        isci_min_credits = 7
+        total_credits_required = 33
+        science_credits_required = 40
+        max_honorary_credits = 10
+        non_isci_science_required = 27
+        total_400_level_required = 12
+        require_isci_449 = False
+
+    validation_results = {
+        'success': True,
+        'messages': [],
+        'total_credits': 0,
+        'science_credits': 0,
+        'isci_credits': 0,
+        'honorary_credits': 0,
+        'total_400_level_credits': 0,
+        'disciplines_400_level': {},
+        'non_isci_science_credits': 0,
+        'non_isci_honorary_credits': 0,
+        'stream': stream,
+        'requirements': {
+            'discipline_count': {'required': '2-3', 'actual': 0, 'met': False},
+            'isci_credits': {'required': isci_min_credits, 'actual': 0, 'met': False},
+            'total_credits': {'required': total_credits_required, 'actual': 0, 'met': False},
+            'science_credits': {'required': science_credits_required, 'actual': 0, 'met': False},
+            'non_isci_science_credits': {'required': non_isci_science_required, 'actual': 0, 'met': False},
+            'honorary_credits': {'required': f'≤ {max_honorary_credits}', 'actual': 0, 'met': True},
+            'total_400_level': {'required': total_400_level_required, 'actual': 0, 'met': False},
+            'disciplines_requirements': {}
+        }
+    }
+
+    isci_courses = disciplines.get("ISCI", [])
+    has_isci_449 = "ISCI 449" in isci_courses
+
+    non_isci_disciplines = [d for d in disciplines.keys() if d != "ISCI"]
+    validation_results['requirements']['discipline_count']['actual'] = len(non_isci_disciplines)
+    validation_results['requirements']['discipline_count']['met'] = 2 <= len(non_isci_disciplines) <= 3
+    if not validation_results['requirements']['discipline_count']['met']:
+        validation_results['success'] = False
+        validation_results['messages'].append("Must have 2-3 disciplines (excluding ISCI)")
+
+    if require_isci_449 and not has_isci_449:
+        validation_results['success'] = False
+        validation_results['messages'].append("Honours stream requires ISCI 449 course")
+
+    total_credits = 0
+    pure_non_isci_science_credits = 0
+    isci_science_credits = 0
+    honorary_courses = []
+    total_400_level_credits = 0
+
+    for discipline in discipline_order:
+        if discipline not in disciplines:
+            continue
+        courses = disciplines[discipline]
+
+        discipline_credits = 0
+        discipline_400_level_credits = 0
+
+        for course in courses:
+            credits = catalog.get(course)
+            discipline_credits += credits.discipline_credit
+
+            if credits.is_400_level:
+                if discipline != "ISCI":
+                    total_400_level_credits += credits.discipline_credit
+                discipline_400_level_credits += credits.discipline_credit
+
+            if discipline == "ISCI":
+                if credits.isci_course:
+                    isci_science_credits += credits.isci_value or credits.discipline_credit
+            else:
+                if credits.honorary_credit:
+                    honorary_courses.append({'course': course, 'credit': credits.honorary_value})
+                elif credits.science_credit:
+                    pure_non_isci_science_credits += credits.science_value
+
+        if discipline != "ISCI":
+            total_credits += discipline_credits
+
+        is_isci_discipline = discipline == "ISCI"
+        min_credits_for_discipline = isci_min_credits if is_isci_discipline else discipline_min_credits
+
+        discipline_met = discipline_credits >= min_credits_for_discipline
+        if is_isci_discipline and require_isci_449:
+            discipline_met = discipline_met and has_isci_449
+
+        has_400_level_met = True
+        if not is_isci_discipline:
+            has_400_level_met = discipline_400_level_credits > 0
+            if not has_400_level_met:
+                validation_results['success'] = False
+                validation_results['messages'].append(
+                    f"Discipline {discipline} must have at least one 400-level course")
+
+        validation_results['requirements']['disciplines_requirements'][discipline] = {
+            'course_count': {'required': min_credits_for_discipline, 'actual': discipline_credits,
+                             'met': discipline_met},
+            'has_400_level': {'required': True, 'actual': discipline_400_level_credits > 0,
+                              'met': has_400_level_met}
+        }
+        if not discipline_met:
+            validation_results['success'] = False
+            if is_isci_discipline and require_isci_449 and not has_isci_449:
+                validation_results['messages'].append("Discipline ISCI requires ISCI 449 for honours stream")
+            else:
+                validation_results['messages'].append(
+                    f"Discipline {discipline} needs at least {min_credits_for_discipline} credits")
+
+    honorary_credits_used = 0
+    honorary_credits_available = 0
+    for course_info in honorary_courses:
+        honorary_credits_available += course_info['credit']
+        if honorary_credits_used + course_info['credit'] <= max_honorary_credits:
+            honorary_credits_used += course_info['credit']
+
+    total_science = isci_science_credits + pure_non_isci_science_credits + honorary_credits_used
+    non_isci_science_total = pure_non_isci_science_credits + honorary_credits_used
+
+    validation_results['total_credits'] = total_credits
+    validation_results['science_credits'] = total_science
+    validation_results['isci_credits'] = isci_science_credits
+    validation_results['non_isci_science_credits'] = non_isci_science_total
+    validation_results['honorary_credits'] = honorary_credits_available
+    validation_results['non_isci_honorary_credits'] = honorary_credits_available
+    validation_results['total_400_level_credits'] = total_400_level_credits
+
+    reqs = validation_results['requirements']
+    reqs['isci_credits']['actual'] = isci_science_credits
+    reqs['isci_credits']['met'] = reqs['isci_credits']['actual'] >= reqs['isci_credits']['required']
+
+    reqs['total_credits']['actual'] = total_credits
+    reqs['total_credits']['met'] = reqs['total_credits']['actual'] >= reqs['total_credits']['required']
+
+    reqs['science_credits']['actual'] = total_science
+    reqs['science_credits']['met'] = reqs['science_credits']['actual'] >= reqs['science_credits']['required']
+
+    reqs['non_isci_science_credits']['actual'] = non_isci_science_total
+    reqs['non_isci_science_credits']['met'] = (
+        reqs['non_isci_science_credits']['actual'] >= reqs['non_isci_science_credits']['required'])
+
+    reqs['honorary_credits']['actual'] = honorary_credits_available
+    reqs['honorary_credits']['met'] = reqs['honorary_credits']['actual'] <= max_honorary_credits
+
+    reqs['total_400_level']['actual'] = total_400_level_credits
+    reqs['total_400_level']['met'] = reqs['total_400_level']['actual'] >= reqs['total_400_level']['required']
+
+    if not reqs['total_credits']['met']:
+        validation_results['success'] = False
+        validation_results['messages'].append(
+            f"Need at least {total_credits_required} total credits in non-ISCI disciplines")
+    if not reqs['science_credits']['met']:
+        validation_results['success'] = False
+        validation_results['messages'].append(f"Need at least {science_credits_required} total science credits")
+    if not reqs['non_isci_science_credits']['met']:
+        validation_results['success'] = False
+        validation_results['messages'].append(
+            f"Need at least {non_isci_science_required} science credits from non-ISCI disciplines")
+    if not reqs['honorary_credits']['met']:
+        validation_results['success'] = False
+        validation_results['messages'].append(f"Cannot have more than {max_honorary_credits} honorary credits")
+    if not reqs['total_400_level']['met']:
+        validation_results['success'] = False
+        validation_results['messages'].append(
+            f"Need at least {total_400_level_required} credits from 400-level non-ISCI courses")
+
+    return validation_results
+
+
+def as_json(results):
+    return json.dumps(results, sort_keys=True)
+
+
+@pytest.fixture(scope='module')
+def course_pool():
+    """Codes weighted towards the awkward ones: NaN credits, honorary, ISCI, 400-level"""
+    records = list(get_catalog().index.values())
+    special = [r.code for r in records
+               if r.discipline_credit != r.discipline_credit or r.honorary_credit or r.isci_course]
+    assert any(r.discipline_credit != r.discipline_credit for r in records), 'catalog has no NaN-credit course'
+    return [r.code for r in records], special
+
+
+def random_step(rng, proposal, codes, special):
+    subjects = sorted({code.split()[0] for code in special}) + ['MATH', 'BIOL', 'CHEM', 'PHYS']
+    roll = rng.random()
+    if roll < 0.45:
+        discipline = rng.choice(proposal.discipline_order)
+        code = rng.choice(special if rng.random() < 0.5 else codes)
+        proposal.add_course(discipline, code)
+    elif roll < 0.6:
+        discipline = rng.choice(proposal.discipline_order)
+        courses = proposal.disciplines[discipline]
+        proposal.remove_course(discipline, rng.choice(courses) if courses else rng.choice(codes))
+    elif roll < 0.72:
+        proposal.add_discipline(rng.choice(subjects))
+    elif roll < 0.8:
+        proposal.remove_discipline(rng.choice(proposal.discipline_order))
+    elif roll < 0.88:
+        proposal.set_stream(rng.choice(['regular', 'honours']))
+    elif roll < 0.93:
+        proposal.undo()
+    elif roll < 0.97:
+        proposal.redo()
+    else:
+        proposal.reset_proposal()
+
+
+def test_matches_full_recompute(course_pool):
+    codes, special = course_pool
+    catalog = get_catalog()
+    for seed in range(SEQUENCES):
+        rng = random.Random(seed)
+        proposal = DegreeProposal(catalog)
+        for step in range(STEPS):
+            random_step(rng, proposal, codes, special)
+            if step % 5 == 4 or step == STEPS - 1:
+                expected = reference_validation(
+                    proposal.stream, proposal.disciplines, proposal.discipline_order, catalog)
+                assert as_json(proposal.validate_proposal()) == as_json(expected), (seed, step)
+
+
+def test_nan_credit_courses(course_pool):
+    catalog = get_catalog()
+    nan_codes = [r.code for r in catalog.index.values() if r.discipline_credit != r.discipline_credit]
+    proposal = DegreeProposal(catalog)
+    for code in nan_codes:
+        subject = code.split()[0]
+        proposal.add_discipline(subject)
+        proposal.add_course(subject, code)
+        assert as_json(proposal.validate_proposal()) == as_json(
+            reference_validation(proposal.stream, proposal.disciplines, proposal.discipline_order, catalog))
+    # Removing them again has to clear the NaN, not leave it in the sums
+    for code in nan_codes:
+        proposal.remove_course(code.split()[0], code)
+        assert as_json(proposal.validate_proposal()) == as_json(
+            reference_validation(proposal.stream, proposal.disciplines, proposal.discipline_order, catalog))
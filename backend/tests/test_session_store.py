@@ -0,0 +1,37 @@
+# backend/tests/test_session_store.py
+"""Session store behaviour shared by every worker thread"""
+import threading
+
+from session_store import MemorySessionStore
+
+
+def test_memory_store_evicts_least_recently_used_of_all_stripes():
+    store = MemorySessionStore(max_sessions=100)
+    for i in range(100):
+        store.put(f's{i}', i)
+    store.get('s0')
+    for i in range(100, 150):
+        store.put(f's{i}', i)
+
+    assert len(store) == 100
+    assert store.get('s0')[0] == 0
+    assert [i for i in range(1, 51) if store.get(f's{i}')[0] is not None] == []
+    assert all(store.get(f's{i}')[0] == i for i in range(51, 150))
+    assert store.stats()['evictions'] == 50
+
+
+def test_memory_store_cap_holds_under_concurrent_puts():
+    store = MemorySessionStore(max_sessions=100)
+
+    def fill(worker):
+        for i in range(2000):
+            store.put(f'{worker}-{i}', i)
+
+    threads = [threading.Thread(target=fill, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store) == 100
+    assert store.stats()['evictions'] == 8 * 2000 - 100
@@ -0,0 +1,114 @@
+# backend/tests/test_tokens.py
+"""Proposals carried in signed tokens, for stateless serving"""
+import base64
+import json
+import random
+
+import pytest
+
+import catalog as catalog_module
+import parser
+from catalog import CATALOG_PATH, CourseCatalog, get_catalog
+from parser import DegreeProposal
+from tokens import InvalidToken, ProposalTokens, StaleToken, _put_varint
+
+PROPOSALS = 300
+
+
+@pytest.fixture
+def tokens():
+    return ProposalTokens('test secret')
+
+
+@pytest.fixture
+def token_app(tokens, monkeypatch):
+    monkeypatch.setattr(parser, 'proposal_tokens', tokens)
+    return parser.app.test_client()
+
+
+@pytest.fixture
+def reloaded_catalog(tmp_path):
+    """A catalog version without MATH 300 and with its rows reordered"""
+    with open(CATALOG_PATH, encoding='utf-8') as f:
+        header, *lines = f.read().splitlines()
+    lines = [line for line in reversed(lines) if ',MATH 300,' not in line]
+    path = tmp_path / 'courses.csv'
+    path.write_text('\n'.join([header] + lines), encoding='utf-8')
+    return CourseCatalog(str(path))
+
+
+def encode(tokens, proposal):
+    return tokens.encode(proposal.stream, [(d, proposal.disciplines[d]) for d in proposal.discipline_order])
+
+
+def test_round_trip(tokens):
+    catalog = get_catalog()
+    codes = list(catalog.index)
+    for seed in range(PROPOSALS):
+        rng = random.Random(seed)
+        proposal = DegreeProposal(catalog)
+        proposal.set_stream(rng.choice(['regular', 'honours']))
+        for subject in rng.sample(['MATH', 'BIOL', 'CHEM', 'PHYS', 'CPSC', 'STAT'], rng.randint(0, 4)):
+            proposal.add_discipline(subject)
+        for _ in range(rng.randint(0, 40)):
+            proposal.add_course(rng.choice(proposal.discipline_order), rng.choice(codes))
+
+        restored = DegreeProposal.from_state(tokens.decode(encode(tokens, proposal), catalog), catalog)
+        assert restored.to_json() == proposal.to_json(), seed
+        assert json.dumps(restored.validate_proposal()) == json.dumps(proposal.validate_proposal()), seed
+
+
+def test_tampered_tokens_are_refused(tokens):
+    token = tokens.encode('regular', [('ISCI', []), ('MATH', ['MATH 300', 'MATH 312'])])
+    raw = bytearray(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    raw[3] ^= 1
+    tampered = base64.urlsafe_b64encode(bytes(raw)).rstrip(b'=').decode('ascii')
+    with pytest.raises(InvalidToken):
+        tokens.decode(tampered, get_catalog())
+    with pytest.raises(InvalidToken):
+        ProposalTokens('another secret').decode(token, get_catalog())
+
+
+def test_tokens_survive_a_catalog_reload(tokens, reloaded_catalog):
+    token = tokens.encode('regular', [('ISCI', []), ('MATH', ['MATH 300', 'MATH 312'])])
+    state = tokens.decode(token, reloaded_catalog)
+    proposal = DegreeProposal.from_state(state, reloaded_catalog)
+    assert proposal.disciplines == {'ISCI': [], 'MATH': ['MATH 312']}
+
+
+def test_index_tokens_decode_on_their_own_catalog(tokens, reloaded_catalog):
+    catalog = get_catalog()
+    codes = list(catalog.index)
+    body = bytearray((1,)) + bytes.fromhex(catalog.version[:8])
+    body += bytes((7,)) + b'regular' + bytes((1, 4)) + b'MATH' + bytes((1,))
+    _put_varint(body, codes.index('MATH 300'))
+    token = base64.urlsafe_b64encode(bytes(body) + tokens._sign(bytes(body))).rstrip(b'=').decode('ascii')
+
+    assert tokens.decode(token, catalog) == {'s': 'regular', 'd': [['MATH', ['MATH 300']]]}
+    with pytest.raises(StaleToken):
+        tokens.decode(token, reloaded_catalog)
+
+
+def test_token_requests_after_a_reload(token_app, tokens, reloaded_catalog, monkeypatch):
+    token = tokens.encode('regular', [('ISCI', []), ('MATH', ['MATH 300', 'MATH 312'])])
+    monkeypatch.setattr(catalog_module, '_catalog', reloaded_catalog)
+    response = token_app.get('/proposal-state', headers={'X-Proposal-Token': token})
+    assert response.status_code == 200
+    assert response.get_json()['disciplines'] == {'ISCI': [], 'MATH': ['MATH 312']}
+    assert tokens.decode(response.headers['X-Proposal-Token'], reloaded_catalog)['d'] == [
+        ['ISCI', []], ['MATH', ['MATH 312']]]
+
+
+@pytest.mark.parametrize('method, path', [
+    ('post', '/proposal/undo'),
+    ('post', '/proposal/redo'),
+    ('post', '/proposal/checkout'),
+    ('post', '/proposal/snapshots'),
+    ('get', '/proposal/history'),
+    ('get', '/proposal/compare?a=0&b=1'),
+])
+def test_history_is_refused_in_stateless_mode(token_app, tokens, method, path):
+    token = tokens.encode('regular', [('ISCI', [])])
+    response = getattr(token_app, method)(path, headers={'X-Proposal-Token': token}, json={'name': 'x'})
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': "Version history isn't available in stateless mode"}
@@ -0,0 +1,195 @@
+# backend/tokens.py
+"""Proposal state in a compact signed token, for stateless serving
+
+A token is URL-safe base64 (unpadded) of:
+
+    format       1 byte  (TOKEN_FORMAT)
+    stream       varint length + UTF-8
+    disciplines  varint count, then per discipline:
+                 varint length + UTF-8 name, varint course count,
+                 per course: varint bytes shared with the previous course
+                 code in the token, then varint length + UTF-8 of the rest
+    signature    MAC_SIZE bytes of HMAC-SHA256 over everything above
+
+Any worker holding the secret can decode it, so the server keeps no
+per-user state. Course codes mostly share their subject with the one
+before, so front coding keeps them short. Codes mean the same course in
+every catalog version, so a token survives catalog reloads: courses the
+current catalog no longer lists are dropped, as rebind does for sessions.
+
+Format 1 tokens held catalog indices instead of codes, behind 4 bytes of
+the catalog version; they still decode against that catalog version.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+
+TOKEN_FORMAT = 2
+# Catalog indices instead of codes, readable only on the same catalog
+LEGACY_INDEX_FORMAT = 1
+# Truncated HMAC-SHA256; 96 bits is plenty against forgery and keeps URLs short
+MAC_SIZE = 12
+
+
+class InvalidToken(ValueError):
+    """The token can't be used; status is the HTTP status to answer with"""
+    status = 400
+
+
+class StaleToken(InvalidToken):
+    status = 409
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def varint(self):
+        value = shift = 0
+        while True:
+            if self.pos >= len(self.data) or shift > 28:
+                raise InvalidToken('Malformed proposal token')
+            byte = self.data[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def raw(self):
+        length = self.varint()
+        if self.pos + length > len(self.data):
+            raise InvalidToken('Malformed proposal token')
+        chunk = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return chunk
+
+    def text(self, raw=None):
+        try:
+            return (self.raw() if raw is None else raw).decode('utf-8')
+        except UnicodeDecodeError:
+            raise InvalidToken('Malformed proposal token')
+
+
+class _CatalogRows:
+    """Catalog index -> course code for one catalog version, for format 1 tokens"""
+
+    def __init__(self, catalog):
+        self.version = catalog.version
+        self.prefix = bytes.fromhex(catalog.version[:8])
+        self.codes = list(catalog.index)
+
+
+class ProposalTokens:
+    """Encodes proposal states into signed tokens and back"""
+
+    def __init__(self, secret):
+        self._key = secret.encode('utf-8')
+        self._rows = None
+
+    def _catalog_rows(self, catalog):
+        rows = self._rows
+        if rows is None or rows.version != catalog.version:
+            rows = self._rows = _CatalogRows(catalog)
+        return rows
+
+    def _sign(self, body):
+        return hmac.new(self._key, body, hashlib.sha256).digest()[:MAC_SIZE]
+
+    def encode(self, stream, disciplines):
+        """Token for a stream and [(discipline, [course codes])...] in order"""
+        out = bytearray((TOKEN_FORMAT,))
+        name = stream.encode('utf-8')
+        _put_varint(out, len(name))
+        out += name
+        _put_varint(out, len(disciplines))
+        previous = b''
+        for discipline, courses in disciplines:
+            name = discipline.encode('utf-8')
+            _put_varint(out, len(name))
+            out += name
+            _put_varint(out, len(courses))
+            for course_code in courses:
+                code = course_code.encode('utf-8')
+                shared = 0
+                for a, b in zip(previous, code):
+                    if a != b:
+                        break
+                    shared += 1
+                _put_varint(out, shared)
+                _put_varint(out, len(code) - shared)
+                out += code[shared:]
+                previous = code
+        body = bytes(out)
+        return base64.urlsafe_b64encode(body + self._sign(body)).rstrip(b'=').decode('ascii')
+
+    def decode(self, token, catalog):
+        """Return the {'s': stream, 'd': [[discipline, [codes]]...]} state in a token
+
+        Raises InvalidToken for tokens that are malformed or not signed with
+        this secret, and StaleToken for format 1 ones made against another
+        catalog. The codes are as encoded, even ones catalog doesn't list.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            raise InvalidToken('Malformed proposal token')
+        body, signature = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+        if len(body) < 2 or not hmac.compare_digest(signature, self._sign(body)):
+            raise InvalidToken('Proposal token signature does not match')
+        if body[0] == LEGACY_INDEX_FORMAT:
+            return self._decode_indices(body, catalog)
+        if body[0] != TOKEN_FORMAT:
+            raise InvalidToken(f"Unsupported proposal token format {body[0]}")
+
+        reader = _Reader(body)
+        reader.pos = 1
+        stream = reader.text()
+        disciplines = []
+        previous = b''
+        for _ in range(reader.varint()):
+            discipline = reader.text()
+            courses = []
+            for _ in range(reader.varint()):
+                shared = reader.varint()
+                if shared > len(previous):
+                    raise InvalidToken('Malformed proposal token')
+                previous = previous[:shared] + reader.raw()
+                courses.append(reader.text(previous))
+            disciplines.append([discipline, courses])
+        if reader.pos != len(body):
+            raise InvalidToken('Malformed proposal token')
+        return {'s': stream, 'd': disciplines}
+
+    def _decode_indices(self, body, catalog):
+        rows = self._catalog_rows(catalog)
+        if len(body) < 5:
+            raise InvalidToken('Malformed proposal token')
+        if body[1:5] != rows.prefix:
+            raise StaleToken('Proposal token was made for another catalog version')
+
+        reader = _Reader(body)
+        reader.pos = 5
+        stream = reader.text()
+        disciplines = []
+        for _ in range(reader.varint()):
+            discipline = reader.text()
+            courses = []
+            for _ in range(reader.varint()):
+                index = reader.varint()
+                if index >= len(rows.codes):
+                    raise InvalidToken('Malformed proposal token')
+                courses.append(rows.codes[index])
+            disciplines.append([discipline, courses])
+        if reader.pos != len(body):
+            raise InvalidToken('Malformed proposal token')
+        return {'s': stream, 'd': disciplines}
@@ -332,7 +332,7 @@ const DegreeProposal = () => {
     searchTimeout.current = setTimeout(async () => {
       setLoadingCourses(true);
       try {
-        const data = await makeApiCall(`/search-courses?query=${encodeURIComponent(query)}`, 'GET');
+        const data = await makeApiCall(`/search-courses?query=${encodeURIComponent(query)}&typeahead=1`, 'GET');
         setCourseSearchResults(data.results || []);
         setShowCourseDropdown(data.results?.length > 0);
       } catch (err) {
@@ -422,7 +422,7 @@ const DegreeProposal = () => {
       setLoading(true);
       try {
         // Use parent's makeApiCall function instead of direct fetch
-        const data = await makeApiCall(`/search-courses?query=${encodeURIComponent(query)}`, 'GET');
+        const data = await makeApiCall(`/search-courses?query=${encodeURIComponent(query)}&typeahead=1`, 'GET');
         setResults(data.results || []); // Access the results property
         setIsOpen(data.results?.length > 0);
       } catch (err) {